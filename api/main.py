@@ -12,22 +12,44 @@ from pathlib import Path
 api_dir = Path(__file__).parent
 project_root = api_dir.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(api_dir))
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import List
+import asyncio
+import functools
+import json
 import tempfile
+import hashlib
+import time
 import numpy as np
 import pickle
-from tensorflow.keras.models import load_model  # type: ignore
-import tensorflow as tf  # type: ignore
 
-# Import preprocessing utilities
-from preprocessing.extract_all_video_features import extract_all_video_features
-from preprocessing.extract_audio import extract_audio
+# Import preprocessing utilities (models inside them load lazily, see model_registry)
+from preprocessing.extract_all_video_features import (
+    extract_all_video_features, load_resnet, warmup as warmup_resnet, VIDEO_BACKEND, SAMPLING_POLICIES
+)
+from preprocessing.decode_audio import decode_audio, media_duration, SAMPLE_RATE
+from preprocessing.segment_media import fixed_windows, silence_windows
+from preprocessing.streaming_mfcc import StreamingMFCC
 from preprocessing.extract_all_audio_features import extract_mfcc_features
-from preprocessing.transcribe_audio import transcribe_audio
-from preprocessing.extract_all_text_features import extract_text_features
+from preprocessing.transcribe_audio import transcribe_audio, asr_version, ASR_ENGINE
+from preprocessing.extract_all_text_features import (
+    extract_text_features, extract_text_features_batch, embedding_memo,
+    load_text_model, warmup as warmup_distilbert, TEXT_BACKEND
+)
+from preprocessing.optimized_backends import load_text_classifier, check_backend
+from preprocessing.memo import BoundedMemo
+
+from result_cache import ResultCache
+from micro_batcher import MicroBatcher
+from stage_pools import build_stage_pools
+from model_registry import ModelRegistry
+from metrics import Metrics
+from upload_limit import UploadLimitMiddleware
 
 app = FastAPI(
     title="Multimodal Sentiment Analysis API",
@@ -35,23 +57,17 @@ app = FastAPI(
     version="2.0.0"
 )
 
-# Configure CORS to allow React frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://localhost:3001",
-        "http://localhost:5173"
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Per-stage latency / in-flight / error metrics on GET /metrics; TIMING_HEADERS=1
+# adds a Server-Timing header with each request's stages
+metrics = Metrics()
+app.middleware("http")(metrics.http_middleware)
 
 # ─── Model globals ────────────────────────────────────────────────────────────
 MODEL_DIR = project_root / "models"
 
-# Custom fusion model
+# Custom fusion model (keras Model or models.numpy_fusion.NumpyFusion)
+# FUSION_BACKEND: auto (numpy when exported, else keras) | numpy | keras
+FUSION_BACKEND = os.environ.get("FUSION_BACKEND", "auto")
 model = None
 scaler_v = None
 scaler_a = None
@@ -59,8 +75,11 @@ scaler_t = None
 le = None
 
 # HuggingFace RoBERTa pipeline
+# HF_BACKEND: fp32 | int8 | onnx | onnx_int8 (DistilBERT / ResNet18 use TEXT_BACKEND /
+# VIDEO_BACKEND) — see preprocessing/optimized_backends.py
 hf_pipeline = None
 HF_MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+HF_BACKEND = check_backend(os.environ.get("HF_BACKEND", "fp32"))
 
 # Label mapping for HF model → our labels
 HF_LABEL_MAP = {
@@ -69,52 +88,235 @@ HF_LABEL_MAP = {
     "neutral": "Neutral",
 }
 
+# Frame sampling of /api/analyze, a name from SAMPLING_POLICIES. The default keeps
+# ~2 frames per second with cv2 preprocessing, so cost no longer grows with the
+# clip's fps and 1080p frames skip the PIL path; `ffmpeg_fps_2` also downscales
+# at decode time, `all` reproduces the training-time features exactly. Compare
+# them with python -m preprocessing.benchmark_video_sampling.
+VIDEO_SAMPLING_POLICY = os.environ.get("VIDEO_SAMPLING_POLICY", "fast_fps_2")
+if VIDEO_SAMPLING_POLICY not in SAMPLING_POLICIES:
+    raise ValueError(f"VIDEO_SAMPLING_POLICY must be one of {sorted(SAMPLING_POLICIES)}, got {VIDEO_SAMPLING_POLICY!r}")
+
+# Versions folded into result cache keys so retrained models never serve stale results
+CUSTOM_MODEL_VERSION = None
+HF_MODEL_VERSION = f"{HF_MODEL_NAME}:{HF_BACKEND}:{asr_version()}"
+
+# ─── Result cache ─────────────────────────────────────────────────────────────
+# RESULT_CACHE_DIR enables the on-disk tier (evicted past RESULT_CACHE_MAX_MB)
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "256")),
+    disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+    disk_max_bytes=int(os.environ.get("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# ─── Stage pools ──────────────────────────────────────────────────────────────
+# Blocking pipeline stages run off the event loop on bounded per-stage pools
+stage_pools = build_stage_pools()
+
+# HF probabilities memoized per exact (stripped) text; RoBERTa is cased and
+# whitespace-sensitive, so no further normalization is applied to the key
+hf_memo = BoundedMemo(
+    max_entries=int(os.environ.get("TEXT_MEMO_MAX_ENTRIES", "4096")),
+    max_bytes=int(float(os.environ.get("TEXT_MEMO_MAX_MB", "64")) * 1024 * 1024),
+    ttl=float(os.environ.get("TEXT_MEMO_TTL", "3600")) or None,
+)
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
+AUDIO_EXTENSIONS = ['.wav', '.mp3', '.m4a', '.flac', '.ogg']
+
+# ─── Upload handling ──────────────────────────────────────────────────────────
+# Request bodies past MAX_UPLOAD_MB (plus multipart framing) are refused with 413
+# by UploadLimitMiddleware before the multipart parser reads them. Uploads are
+# then streamed to a scratch file in UPLOAD_CHUNK_SIZE pieces, with the exact
+# limit checked on the file itself. Scratch files go to the system temp
+# directory; SCRATCH_DIR (e.g. /dev/shm for tmpfs) opts into another one, which
+# is used for an upload only while it has room for it, so concurrent large
+# uploads fall back to disk instead of filling RAM or failing with ENOSPC.
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "500")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
+
+# Configure CORS to allow React frontend. Added last, so it is the outermost
+# middleware and its headers also reach the early 413s of UploadLimitMiddleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:3000",
+        "http://localhost:3001",
+        "http://localhost:5173"
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+SCRATCH_DIR = os.environ.get("SCRATCH_DIR") or None
+if SCRATCH_DIR:
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+
+
+def _scratch_dir(size=None):
+    """SCRATCH_DIR if it has `size` bytes (MAX_UPLOAD_BYTES when unknown) free, else None (system temp)."""
+    if SCRATCH_DIR is None:
+        return None
+    try:
+        st = os.statvfs(SCRATCH_DIR)
+    except (OSError, AttributeError):
+        return None
+    return SCRATCH_DIR if st.f_bavail * st.f_frsize >= (size or MAX_UPLOAD_BYTES) else None
+
+
+# ─── Model loading ────────────────────────────────────────────────────────────
+
+def _load_fusion():
+    """
+    Load the custom fusion model, its scalers and label encoder.
+
+    The NumPy engine (models/fusion_numpy.npz, see models/numpy_fusion.py) is used
+    when it has been exported, so serving does not import TensorFlow; set
+    FUSION_BACKEND=keras to force the original Keras model.
+    """
+    global model, scaler_v, scaler_a, scaler_t, le, CUSTOM_MODEL_VERSION
+
+    numpy_weights = MODEL_DIR / "fusion_numpy.npz"
+    use_numpy = FUSION_BACKEND == "numpy" or (FUSION_BACKEND == "auto" and numpy_weights.exists())
+    if use_numpy:
+        from models.numpy_fusion import NumpyFusion
+        fusion = NumpyFusion(str(numpy_weights))
+        artifacts = ("fusion_numpy.npz",)
+    else:
+        from tensorflow.keras.models import load_model  # type: ignore
+        fusion = load_model(str(MODEL_DIR / "final_multimodal_logits_model.h5"))
+        artifacts = ("final_multimodal_logits_model.h5",)
+
+    with open(MODEL_DIR / "scaler_video.pkl", "rb") as f:
+        scaler_v = pickle.load(f)
+    with open(MODEL_DIR / "scaler_audio.pkl", "rb") as f:
+        scaler_a = pickle.load(f)
+    with open(MODEL_DIR / "scaler_text.pkl", "rb") as f:
+        scaler_t = pickle.load(f)
+    with open(MODEL_DIR / "label_encoder.pkl", "rb") as f:
+        le = pickle.load(f)
+
+    CUSTOM_MODEL_VERSION = _files_fingerprint(
+        *artifacts, "scaler_video.pkl", "scaler_audio.pkl", "scaler_text.pkl", "label_encoder.pkl",
+    ) + f":{VIDEO_BACKEND}:{VIDEO_SAMPLING_POLICY}:{TEXT_BACKEND}:{asr_version()}"
+    model = fusion
+    print(f"🧮 Fusion backend: {'numpy' if use_numpy else 'keras'}")
+
+
+def _warmup_fusion():
+    """Trace the Keras predict graph / precompute NumPy absent-branch biases for the served patterns."""
+    if hasattr(model, "warmup"):
+        model.warmup()
+    for n in (1, TEXT_BATCH_MAX_SIZE):
+        X_aud = np.zeros((n, scaler_a.n_features_in_))
+        X_vid = np.zeros((n, scaler_v.n_features_in_))
+        X_txt = np.zeros((n, scaler_t.n_features_in_))
+        _custom_predict(X_aud, X_vid, X_txt)
+        _custom_predict(X_aud, None, X_txt)
+        _custom_predict(None, None, X_txt)
+
+
+def _load_roberta():
+    global hf_pipeline
+    print(f"⏳ Loading HuggingFace model: {HF_MODEL_NAME} ({HF_BACKEND}) ...")
+    hf_pipeline = load_text_classifier(HF_MODEL_NAME, HF_BACKEND)
+
+
+def _warmup_roberta():
+    hf_pipeline("warming up the sentiment pipeline")
+    hf_pipeline(["warming up", "the sentiment pipeline in batches"], batch_size=2)
+
+
+# MODEL_LOADING: background (default) | lazy | eager — see api/model_registry.py
+registry = ModelRegistry(mode=os.environ.get("MODEL_LOADING", "background"))
+registry.register("fusion", _load_fusion, _warmup_fusion)
+registry.register("resnet18", load_resnet, warmup_resnet)
+registry.register("distilbert", load_text_model, warmup_distilbert)
+registry.register("roberta", _load_roberta, _warmup_roberta)
+registry.define_engine("custom", ["fusion", "resnet18", "distilbert"])
+registry.define_engine("custom_text", ["fusion", "distilbert"])
+registry.define_engine("custom_audio", ["fusion"])
+registry.define_engine("hf", ["roberta"])
+
+
 @app.on_event("startup")
 async def load_models():
-    """Load custom ML models and HuggingFace pipeline on startup"""
-    global model, scaler_v, scaler_a, scaler_t, le, hf_pipeline
+    """Start loading models according to MODEL_LOADING"""
+    registry.start()
 
-    # ── 1. Load custom fusion model ──────────────────────────────────────────
-    try:
-        model = load_model(str(MODEL_DIR / "final_multimodal_logits_model.h5"))
-
-        with open(MODEL_DIR / "scaler_video.pkl", "rb") as f:
-            scaler_v = pickle.load(f)
-        with open(MODEL_DIR / "scaler_audio.pkl", "rb") as f:
-            scaler_a = pickle.load(f)
-        with open(MODEL_DIR / "scaler_text.pkl", "rb") as f:
-            scaler_t = pickle.load(f)
-        with open(MODEL_DIR / "label_encoder.pkl", "rb") as f:
-            le = pickle.load(f)
-
-        print("✅ Custom fusion model loaded successfully")
-    except Exception as e:
-        print(f"❌ Error loading custom model: {e}")
 
-    # ── 2. Load HuggingFace RoBERTa pipeline ────────────────────────────────
-    try:
-        from transformers import pipeline as hf_pipe
-        print(f"⏳ Loading HuggingFace model: {HF_MODEL_NAME} ...")
-        hf_pipeline = hf_pipe(
-            "text-classification",
-            model=HF_MODEL_NAME,
-            top_k=None,          # return all scores
-            truncation=True,
-            max_length=512,
-        )
-        print(f"✅ HuggingFace RoBERTa pipeline loaded successfully")
-    except Exception as e:
-        print(f"❌ Error loading HuggingFace pipeline: {e}")
+async def _require_engine(engine: str, label: str):
+    """Raise 503 unless `engine` is loaded and warm (lazy mode loads it here)."""
+    reason = await registry.require(engine)
+    if reason == "warming":
+        raise HTTPException(status_code=503, detail=f"{label} is still warming up", headers={"Retry-After": "5"})
+    if reason:
+        raise HTTPException(status_code=503, detail=f"{label} not loaded")
+
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    for pool in stage_pools.values():
+        pool.shutdown()
+    registry.shutdown()
 
 
 # ─── Helper ───────────────────────────────────────────────────────────────────
 
-def _run_hf_inference(text: str) -> dict:
-    """Run HuggingFace RoBERTa on text, return standardised result dict."""
-    if not hf_pipeline:
-        raise RuntimeError("HuggingFace pipeline not loaded")
+def _files_fingerprint(*names) -> str:
+    """Short hash of the size and mtime of model artifacts in MODEL_DIR."""
+    h = hashlib.sha256()
+    for name in names:
+        st = (MODEL_DIR / name).stat()
+        h.update(f"{name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def _check_upload_type(file: UploadFile) -> str:
+    """Validate the upload's extension and return it (lower-case, with dot)."""
+    allowed_extensions = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+        )
+    return file_ext
+
 
-    raw = hf_pipeline(text)[0]   # list of {label, score}
+async def _save_upload(file: UploadFile, file_ext: str):
+    """
+    Stream the upload to a scratch file in fixed-size chunks, hashing as it goes.
+    Returns (path, sha256 hex digest). Raises 413 once MAX_UPLOAD_BYTES is exceeded.
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+
+    h = hashlib.sha256()
+    size = 0
+    with metrics.stage("upload_write"), \
+            tempfile.NamedTemporaryFile(delete=False, suffix=file_ext, dir=_scratch_dir(file.size)) as tmp:
+        path = tmp.name
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+                h.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            _cleanup(path)
+            raise
+    return path, h.hexdigest()
+
+
+def _map_hf_scores(raw) -> dict:
+    """Map one RoBERTa output (list of {label, score}) onto our three labels."""
     prob_dict = {}
     for item in raw:
         mapped = HF_LABEL_MAP.get(item["label"].lower(), item["label"].capitalize())
@@ -123,63 +325,158 @@ def _run_hf_inference(text: str) -> dict:
     # Ensure all three keys exist
     for k in ("Positive", "Negative", "Neutral"):
         prob_dict.setdefault(k, 0.0)
+    return prob_dict
+
 
-    sentiment = max(prob_dict, key=prob_dict.get)
-    confidence = prob_dict[sentiment]
-    return {"sentiment": sentiment, "confidence": confidence, "probabilities": prob_dict}
+def _run_hf_inference_batch(texts: list) -> list:
+    """Run HuggingFace RoBERTa on several texts in one pipeline call; memoized texts are skipped."""
+    if not hf_pipeline:
+        raise RuntimeError("HuggingFace pipeline not loaded")
 
+    probs = [hf_memo.get(t) for t in texts]
+    missing = [i for i, p in enumerate(probs) if p is None]
+    if missing:
+        raw = hf_pipeline([texts[i] for i in missing], batch_size=len(missing))
+        for i, scores in zip(missing, raw):
+            probs[i] = _map_hf_scores(scores)
+            hf_memo.put(texts[i], probs[i])
 
-async def _extract_audio_and_transcribe(file: UploadFile):
+    results = []
+    for prob_dict in probs:
+        prob_dict = dict(prob_dict)
+        sentiment = max(prob_dict, key=prob_dict.get)
+        results.append({"sentiment": sentiment, "confidence": prob_dict[sentiment], "probabilities": prob_dict})
+    return results
+
+
+def _run_hf_inference(text: str) -> dict:
+    """Run HuggingFace RoBERTa on text, return standardised result dict."""
+    return _run_hf_inference_batch([text])[0]
+
+
+def _custom_predict(X_aud, X_vid, X_txt, raw=False) -> list:
     """
-    Shared helper: saves uploaded file, extracts / converts audio to WAV,
-    transcribes it, and returns (vid_path, audio_wav_path, transcript, is_audio_only).
-    Caller is responsible for cleanup.
+    Run the fusion model on scaled feature batches, return one result dict per row.
+
+    None marks an absent modality (zero scaled features). The NumPy engine then
+    skips that branch entirely; the Keras model is fed the zeros. raw=True passes
+    unscaled features (NumPy engine only, through its scaler-folded first layers).
     """
-    video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.webm']
-    audio_extensions = ['.wav', '.mp3', '.m4a', '.flac', '.ogg']
-    allowed_extensions = video_extensions + audio_extensions
-    file_ext = Path(file.filename).suffix.lower()
-    is_audio_only = file_ext in audio_extensions
+    if hasattr(model, "predict_modalities"):
+        preds = model.predict_modalities(audio=X_aud, video=X_vid, text=X_txt, raw=raw)
+    else:
+        n = len(next(x for x in (X_aud, X_vid, X_txt) if x is not None))
+        inputs = []
+        for X, scaler in ((X_aud, scaler_a), (X_vid, scaler_v), (X_txt, scaler_t)):
+            if X is None:
+                X = np.zeros((n, scaler.n_features_in_))
+            elif raw:
+                X = scaler.transform(X)
+            inputs.append(X)
+        preds = model.predict(inputs, verbose=0)
+    exp = np.exp(preds - preds.max(axis=-1, keepdims=True))
+    probabilities = exp / exp.sum(axis=-1, keepdims=True)
+    sentiments = le.inverse_transform(np.argmax(preds, axis=1))
+
+    results = []
+    for sentiment, probs in zip(sentiments, probabilities):
+        results.append({
+            "sentiment": sentiment,
+            "confidence": float(np.max(probs)),
+            "probabilities": {label: float(p) for label, p in zip(le.classes_, probs)},
+        })
+    return results
 
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
-        )
 
-    vid_path = None
-    audio_wav_path = None
+def _custom_text_batch(texts: list) -> list:
+    """Custom engine on raw texts: batched DistilBERT + one text-only fusion pass (no video/audio)."""
+    with metrics.stage("text_features"):
+        text_feats = np.stack(extract_text_features_batch(texts))
+    with metrics.stage("fusion"):
+        return _custom_predict(None, None, text_feats, raw=True)
 
-    # Save uploaded file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
-        vid_path = tmp.name
-        tmp.write(await file.read())
 
-    # Get / convert audio to WAV
-    if is_audio_only:
-        if file_ext == '.wav':
-            audio_wav_path = vid_path
-        else:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_a:
-                audio_wav_path = tmp_a.name
-            import subprocess
-            try:
-                subprocess.run(
-                    ['ffmpeg', '-y', '-i', vid_path, '-ar', '16000', '-ac', '1', audio_wav_path],
-                    capture_output=True, check=True
-                )
-            except Exception:
-                audio_wav_path = vid_path
-    else:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_a:
-            audio_wav_path = tmp_a.name
-        if not extract_audio(vid_path, audio_wav_path):
-            raise HTTPException(status_code=500, detail="Could not extract audio from video")
+# Batched RoBERTa, recorded as the same stage as the per-request calls that go through _timed
+_hf_inference_batch = metrics.instrument("hf_inference")(_run_hf_inference_batch)
+
+
+# Micro-batchers for /api/analyze-text: requests arriving within the window share one forward pass
+TEXT_BATCH_WINDOW_MS = float(os.environ.get("TEXT_BATCH_WINDOW_MS", "10"))
+TEXT_BATCH_MAX_SIZE = int(os.environ.get("TEXT_BATCH_MAX_SIZE", "32"))
+custom_text_batcher = MicroBatcher(_custom_text_batch, TEXT_BATCH_MAX_SIZE, TEXT_BATCH_WINDOW_MS,
+                                   pool=stage_pools["text"])
+hf_text_batcher = MicroBatcher(_hf_inference_batch, TEXT_BATCH_MAX_SIZE, TEXT_BATCH_WINDOW_MS,
+                               pool=stage_pools["hf"])
+
+
+async def _extract_audio_and_transcribe(vid_path: str, file_ext: str, timings: dict):
+    """
+    Shared helper: decodes the saved upload's audio once into a 16 kHz mono
+    float buffer, transcribes it, and returns (audio, transcript, is_audio_only).
+    The same buffer feeds MFCC extraction, so no intermediate WAV is written.
+    """
+    is_audio_only = file_ext in AUDIO_EXTENSIONS
+
+    audio = await _timed(timings, "audio_decode", "audio", decode_audio, vid_path)
+    if audio is None:
+        detail = "Could not decode audio file" if is_audio_only else "Could not extract audio from video"
+        raise HTTPException(status_code=500, detail=detail)
 
     # Transcribe
-    transcript = transcribe_audio(audio_wav_path) or ""
+    transcript = await _transcribe(timings, audio)
+
+    return audio, transcript, is_audio_only
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _timed(timings: dict, stage: str, pool: str, fn, *args, wait: bool = False):
+    """
+    Run fn on the named stage pool and record its wall time (ms) under
+    timings[stage]; the call is also counted in the stage's /metrics series.
+    A saturated pool answers 503, or with wait=True (inside a response that is
+    already streaming) is waited on instead.
+    """
+    run = stage_pools[pool].run_when_free if wait else stage_pools[pool].run
+    with metrics.stage(stage) as started:
+        try:
+            return await run(fn, *args)
+        finally:
+            timings[stage] = _elapsed_ms(started)
+
 
-    return vid_path, audio_wav_path, transcript, is_audio_only
+async def _transcribe(timings: dict, samples, wait: bool = False) -> str:
+    """
+    Transcribe on the asr pool (`wait` as in _timed). Long audio is transcribed
+    in chunks; their individual times go to timings["transcription_chunks"] and
+    the number that timed out or failed to timings["transcription_failed_chunks"].
+    """
+    report = {}
+    transcript = await _timed(timings, "transcription", "asr", transcribe_audio, samples, report, wait=wait) or ""
+    chunks = report.get("chunks", [])
+    if len(chunks) > 1:
+        timings["transcription_chunks"] = [chunk["ms"] for chunk in chunks]
+    failed = sum(chunk["status"] != "ok" for chunk in chunks)
+    if failed:
+        timings["transcription_failed_chunks"] = failed
+    return transcript
+
+
+async def _cached_analysis(key: str, compute) -> dict:
+    """
+    result_cache.get_or_compute for the analysis endpoints, with "cached" set.
+    A hit (or a result shared with a concurrent identical request) ran none of
+    the stored stages on this request, so its timings_ms become the single
+    "cache" entry, which is also what /metrics and Server-Timing record.
+    """
+    started = time.perf_counter()
+    result, cached = await result_cache.get_or_compute(key, compute)
+    if not cached:
+        return {**result, "cached": False}
+    metrics.record("cache", time.perf_counter() - started)
+    return {**result, "timings_ms": {"cache": _elapsed_ms(started)}, "cached": True}
 
 
 def _cleanup(*paths):
@@ -200,12 +497,59 @@ async def root():
         "message": "Multimodal Sentiment Analysis API",
         "version": "2.0.0",
         "engines": {
-            "custom_model": model is not None,
-            "huggingface_roberta": hf_pipeline is not None,
-        }
+            "custom_model": registry.is_ready("custom"),
+            "huggingface_roberta": registry.is_ready("hf"),
+        },
+        "backends": {"resnet18": VIDEO_BACKEND, "video_sampling": VIDEO_SAMPLING_POLICY,
+                     "distilbert": TEXT_BACKEND, "roberta": HF_BACKEND, "asr": ASR_ENGINE},
+        "cache": result_cache.stats(),
+        "text_memo": {
+            "custom": embedding_memo.stats(),
+            "huggingface": hf_memo.stats(),
+        },
+        "text_batching": {
+            "custom": custom_text_batcher.stats(),
+            "huggingface": hf_text_batcher.stats(),
+        },
+        "stages": {name: pool.stats() for name, pool in stage_pools.items()},
     }
 
 
+metrics.add_stats("stage_pool", "Stage worker pool", "pool",
+                  lambda: {name: pool.stats() for name, pool in stage_pools.items()})
+metrics.add_stats("text_batcher", "Text micro-batcher", "engine",
+                  lambda: {"custom": custom_text_batcher.stats(), "huggingface": hf_text_batcher.stats()})
+metrics.add_stats("text_memo", "Text memo", "engine",
+                  lambda: {"custom": embedding_memo.stats(), "huggingface": hf_memo.stats()})
+metrics.add_stats("result_cache", "Result cache", "cache", lambda: {"results": result_cache.stats()})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of the pipeline metrics (see api/metrics.py)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/healthz")
+async def liveness():
+    """Liveness probe: the process is up and the event loop is responsive."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readiness(engine: str = Query(default=None, regex="^(custom|custom_text|custom_audio|hf)$")):
+    """
+    Readiness probe. With ?engine=..., 200 only once that engine is loaded and
+    warm; without it, 200 once any engine can serve. The body reports every
+    component's state and load / warmup time.
+    """
+    ready = registry.is_ready(engine) if engine else any(registry.is_ready(e) for e in registry.engines)
+    return JSONResponse(
+        {"ready": ready, **registry.status()},
+        status_code=200 if ready else 503,
+    )
+
+
 # ─── Custom model endpoint ────────────────────────────────────────────────────
 
 @app.post("/api/analyze")
@@ -213,48 +557,79 @@ async def analyze_video(file: UploadFile = File(...)):
     """
     Analyze sentiment from video/audio using the custom multimodal fusion model.
     """
-    if not model or not scaler_v or not scaler_a or not scaler_t or not le:
-        raise HTTPException(status_code=503, detail="Custom model not loaded")
+    await _require_engine("custom", "Custom model")
 
-    vid_path = audio_wav_path = None
+    file_ext = _check_upload_type(file)
+    vid_path, digest = await _save_upload(file, file_ext)
     try:
-        vid_path, audio_wav_path, transcript, is_audio_only = await _extract_audio_and_transcribe(file)
+        key = ResultCache.make_key(digest, "custom", CUSTOM_MODEL_VERSION)
+        result = await _cached_analysis(key, lambda: _analyze_video_uncached(vid_path, file_ext))
+    finally:
+        _cleanup(vid_path)
+    return JSONResponse(result)
+
 
+async def _analyze_video_uncached(vid_path: str, file_ext: str) -> dict:
+    """
+    Custom-engine pipeline as a small stage graph; independent branches run concurrently:
+
+        video features ─────────────────────────────┐
+        audio decode ─┬─ MFCC ──────────────────────┼─ fusion
+                      └─ transcription ─ DistilBERT ┘
+    """
+    is_audio_only = file_ext in AUDIO_EXTENSIONS
+    timings = {}
+    started = time.perf_counter()
+
+    async def video_branch():
         if is_audio_only:
             print("🎵 Audio-only mode — zero vector for video features")
-            video_feat_scaled = np.zeros(scaler_v.n_features_in_)
-        else:
-            print("🎬 Extracting video features...")
-            video_feat_raw = extract_all_video_features(vid_path)
-            if video_feat_raw is None:
-                raise HTTPException(status_code=500, detail="Could not extract video features")
-            video_feat_scaled = scaler_v.transform(video_feat_raw.reshape(1, -1))[0]
-
+            return np.zeros(scaler_v.n_features_in_)
+        print("🎬 Extracting video features...")
+        video_feat_raw = await _timed(timings, "video_features", "video", functools.partial(
+            extract_all_video_features, vid_path, **SAMPLING_POLICIES[VIDEO_SAMPLING_POLICY]))
+        if video_feat_raw is None:
+            raise HTTPException(status_code=500, detail="Could not extract video features")
+        return scaler_v.transform(video_feat_raw.reshape(1, -1))[0]
+
+    async def mfcc_branch(audio):
         print("🎙️ Extracting audio (MFCC) features...")
-        mfcc_vec_raw = extract_mfcc_features(audio_wav_path)
+        mfcc_vec_raw = await _timed(timings, "mfcc", "mfcc", extract_mfcc_features, audio)
         if mfcc_vec_raw is None:
             raise HTTPException(status_code=500, detail="Could not extract audio features")
-        mfcc_vec_scaled = scaler_a.transform(mfcc_vec_raw.reshape(1, -1))[0]
+        return scaler_a.transform(mfcc_vec_raw.reshape(1, -1))[0]
 
+    async def text_branch(audio):
+        transcript = await _transcribe(timings, audio)
         print("📝 Extracting text features...")
         text_feat_scaled = np.zeros(768)
         if transcript:
-            text_feat_raw = extract_text_features(transcript)
+            text_feat_raw = await _timed(timings, "text_features", "text", extract_text_features, transcript)
             if text_feat_raw is not None:
                 text_feat_scaled = scaler_t.transform(text_feat_raw.reshape(1, -1))[0]
+        return transcript, text_feat_scaled
+
+    async def audio_branch():
+        audio = await _timed(timings, "audio_decode", "audio", decode_audio, vid_path)
+        if audio is None:
+            detail = "Could not decode audio file" if is_audio_only else "Could not extract audio from video"
+            raise HTTPException(status_code=500, detail=detail)
+        return await asyncio.gather(mfcc_branch(audio), text_branch(audio))
+
+    try:
+        video_feat_scaled, (mfcc_vec_scaled, (transcript, text_feat_scaled)) = await asyncio.gather(
+            video_branch(), audio_branch()
+        )
 
         print("🤖 Running custom model prediction...")
         X_aud = np.expand_dims(mfcc_vec_scaled, 0)
-        X_vid = np.expand_dims(video_feat_scaled, 0)
+        X_vid = None if is_audio_only else np.expand_dims(video_feat_scaled, 0)
         X_txt = np.expand_dims(text_feat_scaled, 0)
 
-        preds = model.predict([X_aud, X_vid, X_txt], verbose=0)
-        idx = np.argmax(preds, axis=1)[0]
-        sentiment = le.inverse_transform([idx])[0]
-
-        probabilities = tf.nn.softmax(preds[0]).numpy()
-        prob_dict = {label: float(prob) for label, prob in zip(le.classes_, probabilities)}
-        confidence = float(np.max(probabilities))
+        prediction = (await _timed(timings, "fusion", "fusion", _custom_predict, X_aud, X_vid, X_txt))[0]
+        sentiment = prediction["sentiment"]
+        confidence = prediction["confidence"]
+        prob_dict = prediction["probabilities"]
 
         video_score = float(np.mean(np.abs(video_feat_scaled)))
         audio_score = float(np.mean(np.abs(mfcc_vec_scaled)))
@@ -265,7 +640,7 @@ async def analyze_video(file: UploadFile = File(...)):
         if transcript:
             print(f"📝 Transcript: {transcript}")
 
-        return JSONResponse({
+        return {
             "success":     True,
             "sentiment":   sentiment,
             "confidence":  confidence,
@@ -276,18 +651,15 @@ async def analyze_video(file: UploadFile = File(...)):
                 "video": video_score / total,
                 "audio": audio_score / total,
                 "text":  text_score  / total,
-            }
-        })
+            },
+            "timings_ms": {**timings, "total": _elapsed_ms(started)},
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         import traceback; traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
-    finally:
-        _cleanup(vid_path)
-        if audio_wav_path != vid_path:
-            _cleanup(audio_wav_path)
 
 
 # ─── HuggingFace RoBERTa endpoint ─────────────────────────────────────────────
@@ -298,12 +670,23 @@ async def analyze_hf(file: UploadFile = File(...)):
     Analyze sentiment using HuggingFace twitter-roberta-base-sentiment-latest.
     For video/audio: transcribes speech then classifies transcript.
     """
-    if not hf_pipeline:
-        raise HTTPException(status_code=503, detail="HuggingFace pipeline not loaded")
+    await _require_engine("hf", "HuggingFace pipeline")
 
-    vid_path = audio_wav_path = None
+    file_ext = _check_upload_type(file)
+    vid_path, digest = await _save_upload(file, file_ext)
     try:
-        vid_path, audio_wav_path, transcript, is_audio_only = await _extract_audio_and_transcribe(file)
+        key = ResultCache.make_key(digest, "huggingface", HF_MODEL_VERSION)
+        result = await _cached_analysis(key, lambda: _analyze_hf_uncached(vid_path, file_ext))
+    finally:
+        _cleanup(vid_path)
+    return JSONResponse(result)
+
+
+async def _analyze_hf_uncached(vid_path: str, file_ext: str) -> dict:
+    timings = {}
+    started = time.perf_counter()
+    try:
+        audio, transcript, is_audio_only = await _extract_audio_and_transcribe(vid_path, file_ext, timings)
 
         if not transcript:
             raise HTTPException(
@@ -312,12 +695,12 @@ async def analyze_hf(file: UploadFile = File(...)):
             )
 
         print(f"⚡ Running HuggingFace RoBERTa on transcript ({len(transcript.split())} words)...")
-        result = _run_hf_inference(transcript)
+        result = await _timed(timings, "hf_inference", "hf", _run_hf_inference, transcript)
 
         print(f"✅ HuggingFace result: {result['sentiment']} ({result['confidence']:.2%})")
         print(f"📝 Transcript: {transcript}")
 
-        return JSONResponse({
+        return {
             "success":       True,
             "sentiment":     result["sentiment"],
             "confidence":    result["confidence"],
@@ -328,18 +711,288 @@ async def analyze_hf(file: UploadFile = File(...)):
                 "video": 0.0,
                 "audio": 0.33,
                 "text":  0.67,
-            }
-        })
+            },
+            "timings_ms": {**timings, "total": _elapsed_ms(started)},
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         import traceback; traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"HuggingFace analysis failed: {str(e)}")
+
+
+# ─── Timeline endpoint ────────────────────────────────────────────────────────
+# Long media is split into windows that flow through the same stage pools as
+# /api/analyze; at most TIMELINE_MAX_INFLIGHT windows are in flight, and each
+# result is streamed as soon as it and every earlier window are done.
+TIMELINE_MAX_INFLIGHT = int(os.environ.get("TIMELINE_MAX_INFLIGHT", "3"))
+TIMELINE_MAX_WINDOWS = int(os.environ.get("TIMELINE_MAX_WINDOWS", "2000"))
+TIMELINE_VIDEO_POLICY = os.environ.get("TIMELINE_VIDEO_POLICY", "fps_2")
+if TIMELINE_VIDEO_POLICY not in SAMPLING_POLICIES:
+    raise ValueError(f"TIMELINE_VIDEO_POLICY must be one of {sorted(SAMPLING_POLICIES)}, got {TIMELINE_VIDEO_POLICY!r}")
+
+
+async def _analyze_window(vid_path: str, is_audio_only: bool, engine: str, start: float, end: float,
+                          samples=None) -> dict:
+    """
+    Sentiment of one [start, end) window; `samples` is its audio when already decoded.
+    The response is already streaming, so busy stage pools are waited on rather
+    than failing the window with 503.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    if samples is None:
+        samples = await _timed(timings, "audio_decode", "audio", decode_audio,
+                               vid_path, SAMPLE_RATE, start, end - start, wait=True)
+    if samples is None or not len(samples):
+        raise HTTPException(status_code=422, detail="No audio in this window")
+
+    if engine == "hf":
+        transcript = await _transcribe(timings, samples, wait=True)
+        if not transcript:
+            raise HTTPException(status_code=422, detail="No speech detected in this window")
+        result = await _timed(timings, "hf_inference", "hf", _run_hf_inference, transcript, wait=True)
+    else:
+        async def video_branch():
+            if is_audio_only:
+                return None
+            feat = await _timed(timings, "video_features", "video", functools.partial(
+                extract_all_video_features, vid_path, start=start, end=end,
+                **SAMPLING_POLICIES[TIMELINE_VIDEO_POLICY]), wait=True)
+            return None if feat is None else feat.reshape(1, -1)
+
+        async def text_branch():
+            transcript = await _transcribe(timings, samples, wait=True)
+            feat = None
+            if transcript:
+                feat = await _timed(timings, "text_features", "text", extract_text_features, transcript, wait=True)
+            return transcript, None if feat is None else feat.reshape(1, -1)
+
+        mfcc = _timed(timings, "mfcc", "mfcc", extract_mfcc_features, samples, wait=True)
+        X_vid, (transcript, X_txt), X_aud = await asyncio.gather(video_branch(), text_branch(), mfcc)
+        if X_aud is None:
+            raise HTTPException(status_code=500, detail="Could not extract audio features")
+        # Unscaled features; absent video / text take the modality-specific fusion path
+        result = (await _timed(timings, "fusion", "fusion", _custom_predict,
+                               X_aud.reshape(1, -1), X_vid, X_txt, True, wait=True))[0]
+
+    return {
+        "sentiment":     result["sentiment"],
+        "confidence":    result["confidence"],
+        "probabilities": result["probabilities"],
+        "transcript":    transcript,
+        "timings_ms":    {**timings, "total": _elapsed_ms(started)},
+    }
+
+
+async def _stream_timeline(vid_path: str, file_ext: str, engine: str, mode: str, window: float, hop: float,
+                           min_window: float, max_window: float):
+    """
+    Yield NDJSON: a "meta" line with the windows, one "window" line per window
+    in time order, then a "summary" line with duration-weighted mean probabilities.
+    Deletes the upload when done (or when the client disconnects).
+    """
+    is_audio_only = file_ext in AUDIO_EXTENSIONS
+    started = time.perf_counter()
+    try:
+        audio = None
+        if mode == "silence":
+            # Pauses can only be found on the decoded track, so it is decoded once up front
+            audio = await stage_pools["audio"].run_when_free(decode_audio, vid_path)
+            if audio is None:
+                yield json.dumps({"type": "error", "error": "Could not decode audio"}) + "\n"
+                return
+            windows = silence_windows(audio, SAMPLE_RATE, min_window, max_window)
+        else:
+            duration = await stage_pools["audio"].run_when_free(media_duration, vid_path)
+            if not duration:
+                yield json.dumps({"type": "error", "error": "Could not determine media duration"}) + "\n"
+                return
+            windows = fixed_windows(duration, window, hop)
+
+        if len(windows) > TIMELINE_MAX_WINDOWS:
+            yield json.dumps({"type": "error",
+                              "error": f"{len(windows)} windows exceeds the limit of {TIMELINE_MAX_WINDOWS}"}) + "\n"
+            return
+        yield json.dumps({"type": "meta", "engine": engine, "mode": mode, "windows": len(windows),
+                          "duration": windows[-1][1] if windows else 0.0}) + "\n"
+
+        def launch(start, end):
+            samples = None
+            if audio is not None:
+                samples = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            return asyncio.ensure_future(_analyze_window(vid_path, is_audio_only, engine, start, end, samples))
+
+        pending = []
+        totals, weight = {}, 0.0
+        next_window = 0
+        try:
+            for index, (start, end) in enumerate(windows):
+                while next_window < len(windows) and len(pending) < TIMELINE_MAX_INFLIGHT:
+                    pending.append(launch(*windows[next_window]))
+                    next_window += 1
+                task = pending.pop(0)
+                line = {"type": "window", "index": index, "start": start, "end": end}
+                try:
+                    result = await task
+                    line.update(success=True, **result)
+                    for label, p in result["probabilities"].items():
+                        totals[label] = totals.get(label, 0.0) + p * (end - start)
+                    weight += end - start
+                except HTTPException as e:
+                    line.update(success=False, error=e.detail)
+                except Exception as e:
+                    line.update(success=False, error=str(e))
+                yield json.dumps(line) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+
+        summary = {"type": "summary", "windows": len(windows), "total_ms": _elapsed_ms(started)}
+        if weight:
+            probabilities = {label: total / weight for label, total in totals.items()}
+            sentiment = max(probabilities, key=probabilities.get)
+            summary.update(sentiment=sentiment, confidence=probabilities[sentiment], probabilities=probabilities)
+        yield json.dumps(summary) + "\n"
     finally:
         _cleanup(vid_path)
-        if audio_wav_path != vid_path:
-            _cleanup(audio_wav_path)
+
+
+@app.post("/api/analyze-timeline")
+async def analyze_timeline(
+    file: UploadFile = File(...),
+    model_engine: str = Query(default="custom", regex="^(custom|hf)$"),
+    mode: str = Query(default="fixed", regex="^(fixed|silence)$"),
+    window: float = Query(default=10.0, gt=0.5, le=600),
+    hop: float = Query(default=None, gt=0.5, le=600),
+    min_window: float = Query(default=4.0, gt=0.5, le=600),
+    max_window: float = Query(default=15.0, gt=0.5, le=600),
+):
+    """
+    Sentiment timeline of a long video/audio file, streamed as application/x-ndjson.
+
+    mode=fixed: windows of `window` seconds every `hop` seconds (default: back to back).
+    mode=silence: windows end at pauses, between min_window and max_window seconds.
+    Each window is analysed like /api/analyze (custom) or /api/analyze-hf (hf) and
+    its line is sent as soon as it is ready, so the first result does not wait for
+    the rest of the file.
+    """
+    if model_engine == "hf":
+        await _require_engine("hf", "HuggingFace pipeline")
+    else:
+        await _require_engine("custom", "Custom model")
+    if max_window < min_window:
+        raise HTTPException(status_code=400, detail="max_window must be at least min_window")
+
+    file_ext = _check_upload_type(file)
+    stage_pools["audio"].check_capacity()
+    vid_path, _ = await _save_upload(file, file_ext)
+    return StreamingResponse(
+        _stream_timeline(vid_path, file_ext, model_engine, mode, window, hop, min_window, max_window),
+        media_type="application/x-ndjson",
+    )
+
+
+# ─── Live audio endpoint ──────────────────────────────────────────────────────
+# Mono PCM chunks update a StreamingMFCC on the event loop; per chunk this is
+# O(chunk) numpy work (rejected past STREAM_MAX_CHUNK_SECONDS), independent of
+# how long the call has been running. Predictions run on the fusion pool.
+STREAM_PREDICT_INTERVAL = float(os.environ.get("STREAM_PREDICT_INTERVAL", "2.0"))
+STREAM_MAX_CHUNK_SECONDS = float(os.environ.get("STREAM_MAX_CHUNK_SECONDS", "1.0"))
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", "7200"))
+PCM_ENCODINGS = {"s16le": ("<i2", 1.0 / 32768), "f32le": ("<f4", 1.0)}
+
+
+async def _stream_prediction(stream: StreamingMFCC, final: bool) -> dict:
+    """Audio-only custom-engine prediction from the stream's running mean MFCC."""
+    mfcc = stream.mean()
+    message = {"type": "prediction", "final": final, "audio_seconds": round(stream.seconds, 3),
+               "frames": stream.n_frames}
+    if mfcc is None:
+        return {**message, "sentiment": None}
+    result = (await stage_pools["fusion"].run(_custom_predict, mfcc.reshape(1, -1), None, None, True))[0]
+    return {
+        **message,
+        "sentiment":     result["sentiment"],
+        "confidence":    result["confidence"],
+        "probabilities": result["probabilities"],
+        "engine":        "custom",
+        "breakdown":     {"video": 0.0, "audio": 1.0, "text": 0.0},
+    }
+
+
+@app.websocket("/ws/analyze-audio")
+async def analyze_audio_stream(
+    websocket: WebSocket,
+    sample_rate: int = Query(default=16000, ge=8000, le=48000),
+    encoding: str = Query(default="s16le", regex="^(s16le|f32le)$"),
+    interval: float = Query(default=STREAM_PREDICT_INTERVAL, ge=0.5, le=60),
+):
+    """
+    Live sentiment of a mono PCM audio stream with the custom engine (audio only).
+
+    Send binary messages of raw PCM (`encoding` at `sample_rate`, at most
+    STREAM_MAX_CHUNK_SECONDS each) and the text message "end" when done. A
+    "prediction" message is pushed every `interval` seconds of audio, and a
+    final one (final=true) after "end", before the server closes the socket.
+    """
+    await websocket.accept()
+    reason = await registry.require("custom_audio")
+    if reason:
+        await websocket.send_json({"type": "error", "error": f"Custom model {reason}"})
+        await websocket.close(code=1013)
+        return
+
+    dtype, scale = PCM_ENCODINGS[encoding]
+    width = np.dtype(dtype).itemsize
+    max_chunk_bytes = int(STREAM_MAX_CHUNK_SECONDS * sample_rate) * width
+    stream = StreamingMFCC(input_rate=sample_rate)
+    next_prediction = interval
+    leftover = b""
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                data = leftover + message["bytes"]
+                if len(data) > max_chunk_bytes + width:
+                    await websocket.send_json({"type": "error",
+                                               "error": f"Chunks must be at most {STREAM_MAX_CHUNK_SECONDS}s of audio"})
+                    await websocket.close(code=1009)
+                    return
+                usable = len(data) - len(data) % width
+                leftover = data[usable:]
+                stream.update(np.frombuffer(data[:usable], dtype=dtype).astype(np.float32) * scale)
+
+                if stream.seconds >= STREAM_MAX_SECONDS:
+                    break
+                if stream.seconds >= next_prediction:
+                    next_prediction = stream.seconds + interval
+                    try:
+                        await websocket.send_json(await _stream_prediction(stream, final=False))
+                    except HTTPException:
+                        pass    # fusion pool saturated: skip this update, the next one catches up
+
+            elif (message.get("text") or "").strip().lower() in ("end", "stop"):
+                break
+
+        stream.finalize()
+        await websocket.send_json(await _stream_prediction(stream, final=True))
+        await websocket.close()
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        try:
+            await websocket.send_json({"type": "error", "error": f"Stream analysis failed: {str(e)}"})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
 
 
 # ─── Text-only endpoints ──────────────────────────────────────────────────────
@@ -357,10 +1010,9 @@ async def analyze_text(
 
     # ── HuggingFace path ─────────────────────────────────────────────────────
     if model_engine == "hf":
-        if not hf_pipeline:
-            raise HTTPException(status_code=503, detail="HuggingFace pipeline not loaded")
+        await _require_engine("hf", "HuggingFace pipeline")
         try:
-            result = _run_hf_inference(text)
+            result = await hf_text_batcher.submit(text)
             return JSONResponse({
                 "success":       True,
                 "sentiment":     result["sentiment"],
@@ -369,45 +1021,105 @@ async def analyze_text(
                 "engine":        "huggingface",
                 "breakdown":     {"video": 0.0, "audio": 0.0, "text": 1.0}
             })
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"HuggingFace text analysis failed: {str(e)}")
 
     # ── Custom model path ────────────────────────────────────────────────────
-    if not model or not scaler_t or not le:
-        raise HTTPException(status_code=503, detail="Custom model not loaded")
+    await _require_engine("custom_text", "Custom model")
     try:
-        text_feat_raw = extract_text_features(text)
-        if text_feat_raw is None:
-            raise HTTPException(status_code=500, detail="Could not extract text features")
-
-        text_feat_scaled = scaler_t.transform(text_feat_raw.reshape(1, -1))[0]
-        video_feat_scaled = np.zeros(scaler_v.n_features_in_)
-        mfcc_vec_scaled   = np.zeros(scaler_a.n_features_in_)
-
-        X_aud = np.expand_dims(mfcc_vec_scaled, 0)
-        X_vid = np.expand_dims(video_feat_scaled, 0)
-        X_txt = np.expand_dims(text_feat_scaled, 0)
-
-        preds = model.predict([X_aud, X_vid, X_txt], verbose=0)
-        idx = np.argmax(preds, axis=1)[0]
-        sentiment = le.inverse_transform([idx])[0]
-
-        probabilities = tf.nn.softmax(preds[0]).numpy()
-        prob_dict = {label: float(prob) for label, prob in zip(le.classes_, probabilities)}
-        confidence = float(np.max(probabilities))
-
+        result = await custom_text_batcher.submit(text)
         return JSONResponse({
             "success":       True,
-            "sentiment":     sentiment,
-            "confidence":    confidence,
-            "probabilities": prob_dict,
+            "sentiment":     result["sentiment"],
+            "confidence":    result["confidence"],
+            "probabilities": result["probabilities"],
             "engine":        "custom",
             "breakdown":     {"video": 0.0, "audio": 0.0, "text": 1.0}
         })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Custom text analysis failed: {str(e)}")
 
 
+# ─── Bulk text endpoint ───────────────────────────────────────────────────────
+
+BULK_MAX_TEXTS = int(os.environ.get("BULK_MAX_TEXTS", "10000"))
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "64"))
+
+
+class TextBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1)
+    model_engine: str = Field(default="custom", pattern="^(custom|hf)$")
+
+
+async def _stream_text_batch(texts: list, model_engine: str):
+    """
+    Yield one NDJSON line per text. Texts are sorted by length and processed
+    in BULK_BATCH_SIZE buckets so each padded batch holds similar lengths;
+    every line carries the text's original "index".
+    """
+    engine_name = "huggingface" if model_engine == "hf" else "custom"
+    run_batch = _hf_inference_batch if model_engine == "hf" else _custom_text_batch
+    pool = stage_pools["hf" if model_engine == "hf" else "text"]
+
+    texts = [t.strip() for t in texts]
+    valid = []
+    for i, text in enumerate(texts):
+        if len(text) < 3:
+            yield json.dumps({"index": i, "success": False, "error": "Text must be at least 3 characters"}) + "\n"
+        else:
+            valid.append(i)
+
+    order = sorted(valid, key=lambda i: len(texts[i]))
+    for start in range(0, len(order), BULK_BATCH_SIZE):
+        bucket = order[start:start + BULK_BATCH_SIZE]
+        try:
+            # One bucket at a time through the pool's admission and accounting
+            results = await pool.run_when_free(run_batch, [texts[i] for i in bucket])
+        except Exception as e:
+            for i in bucket:
+                yield json.dumps({"index": i, "success": False, "error": str(e)}) + "\n"
+            continue
+
+        yield "".join(
+            json.dumps({
+                "index":         i,
+                "success":       True,
+                "sentiment":     result["sentiment"],
+                "confidence":    result["confidence"],
+                "probabilities": result["probabilities"],
+                "engine":        engine_name,
+            }) + "\n"
+            for i, result in zip(bucket, results)
+        )
+
+
+@app.post("/api/analyze-text-batch")
+async def analyze_text_batch(request: TextBatchRequest):
+    """
+    Classify many texts in one call with either engine.
+    Body: {"texts": [...], "model_engine": "custom" | "hf"}.
+    Streams application/x-ndjson, one object per text with its original "index";
+    lines arrive in length-bucket order, not input order.
+    """
+    if len(request.texts) > BULK_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_TEXTS} texts per request")
+
+    if request.model_engine == "hf":
+        await _require_engine("hf", "HuggingFace pipeline")
+    else:
+        await _require_engine("custom_text", "Custom model")
+    stage_pools["hf" if request.model_engine == "hf" else "text"].check_capacity()
+
+    return StreamingResponse(
+        _stream_text_batch(request.texts, request.model_engine),
+        media_type="application/x-ndjson",
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting Multimodal Sentiment Analysis API v2.0 ...")
@@ -0,0 +1,247 @@
+"""
+Prometheus metrics for the inference pipeline, rendered in the text
+exposition format by GET /metrics (no client library needed).
+
+- stage_duration_seconds{stage}   histogram of every pipeline stage (upload
+  write, audio decode, transcription, video / MFCC / text features, fusion,
+  HF inference), fed by main._timed and `instrument`
+- stage_in_flight{stage}          stage calls currently running or queued
+- stage_errors_total{stage}       stage calls that raised
+- http_request_duration_seconds{method, route, status} and
+  http_requests_in_flight         per endpoint, from the timing middleware
+- stage pool, micro-batcher and cache gauges (in flight, queue depth,
+  rejections, ...) read from their stats() at scrape time
+
+With TIMING_HEADERS=1 every HTTP response carries a Server-Timing header with
+the stages of that request (for streamed responses, the stages that ran
+before the headers were sent). Stage pools copy the request's context into
+their worker threads, and a micro-batch adds its stages to every request in
+the batch (`shared_request_stages`).
+"""
+
+import os
+import re
+import time
+import functools
+import threading
+import contextlib
+import contextvars
+from collections import defaultdict
+
+TIMING_HEADERS = os.environ.get("TIMING_HEADERS", "0").lower() in ("1", "true", "yes")
+
+# Seconds; the pipeline spans ~1 ms (fusion) to minutes (long uploads)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# [(stage, seconds)] of the HTTP request being served, for Server-Timing
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+class _SharedStages:
+    """Stage list of a micro-batch: every stage is added to each member request's list."""
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def append(self, entry):
+        for target in self.targets:
+            target.append(entry)
+
+
+def current_request_stages():
+    """Stage list of the request being served in this context, or None."""
+    return _request_stages.get()
+
+
+@contextlib.contextmanager
+def shared_request_stages(stage_lists):
+    """Within the block, recorded stages go to every list in stage_lists (None entries are ignored)."""
+    token = _request_stages.set(_SharedStages([s for s in stage_lists if s is not None]))
+    try:
+        yield
+    finally:
+        _request_stages.reset(token)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.counts = {}   # labels -> per-bucket counts (non-cumulative), last slot +Inf
+        self.sums = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        slot = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            counts = self.counts.setdefault(labels, [0] * (len(self.buckets) + 1))
+            counts[slot] += 1
+            self.sums[labels] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, counts in sorted(self.counts.items()):
+                total = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    total += count
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {total}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(self.sums[labels])}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {total}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, prefix="sentiment"):
+        self.prefix = prefix
+        self.stage_duration = Histogram(f"{prefix}_stage_duration_seconds", "Wall time of a pipeline stage call.", ("stage",))
+        self.stage_in_flight = Gauge(f"{prefix}_stage_in_flight", "Pipeline stage calls running or queued.", ("stage",))
+        self.stage_errors = Counter(f"{prefix}_stage_errors_total", "Pipeline stage calls that raised.", ("stage",))
+        self.request_duration = Histogram(f"{prefix}_http_request_duration_seconds",
+                                          "HTTP request latency until the response headers.",
+                                          ("method", "route", "status"))
+        self.requests_in_flight = Gauge(f"{prefix}_http_requests_in_flight", "HTTP requests being served.")
+        self.requests_in_flight.inc(amount=0)
+        self._collectors = []   # (name, help, label name, callable -> {label value: stats dict})
+
+    # ── Stages ───────────────────────────────────────────────────────────────
+
+    @contextlib.contextmanager
+    def stage(self, stage):
+        """Record the enclosed block as one call of `stage`; yields its perf_counter start."""
+        self.stage_in_flight.inc(stage)
+        started = time.perf_counter()
+        error = True
+        try:
+            yield started
+            error = False
+        finally:
+            self.stage_in_flight.dec(stage)
+            self.record(stage, time.perf_counter() - started, error)
+
+    def record(self, stage, seconds, error=False):
+        """Record one call of `stage` measured by the caller (histogram, errors, Server-Timing)."""
+        self.stage_duration.observe(seconds, stage)
+        if error:
+            self.stage_errors.inc(stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((stage, seconds))
+
+    def instrument(self, stage):
+        """Decorator recording every call of a blocking function as `stage`."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # ── Scrape-time gauges ───────────────────────────────────────────────────
+
+    def add_stats(self, name, help, label, collect):
+        """
+        Export the numeric fields of stats() dicts: collect() returns
+        {label value: stats dict}, each field becomes <prefix>_<name>_<field>{label=...}.
+        """
+        self._collectors.append((name, help, label, collect))
+
+    def _render_stats(self):
+        lines = []
+        for name, help, label, collect in self._collectors:
+            fields = defaultdict(list)
+            for key, stats in collect().items():
+                for field, value in stats.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        fields[field].append((key, value))
+            for field, samples in sorted(fields.items()):
+                metric = f"{self.prefix}_{name}_{re.sub(r'[^a-zA-Z0-9_]', '_', field)}"
+                lines += [f"# HELP {metric} {help} ({field})", f"# TYPE {metric} gauge"]
+                lines += [f"{metric}{_labels((label,), (key,))} {_number(value)}" for key, value in samples]
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_duration, self.stage_in_flight, self.stage_errors,
+                       self.request_duration, self.requests_in_flight):
+            lines += metric.render()
+        lines += self._render_stats()
+        return "\n".join(lines) + "\n"
+
+    # ── HTTP middleware ──────────────────────────────────────────────────────
+
+    async def http_middleware(self, request, call_next):
+        """Request latency / in-flight metrics and, with TIMING_HEADERS, a Server-Timing header."""
+        if request.url.path == "/metrics":
+            return await call_next(request)
+
+        stages = []
+        token = _request_stages.set(stages)
+        self.requests_in_flight.inc()
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            seconds = time.perf_counter() - started
+            self.requests_in_flight.dec()
+            _request_stages.reset(token)
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            self.request_duration.observe(seconds, request.method, route, status)
+        if TIMING_HEADERS:
+            response.headers["Server-Timing"] = server_timing(stages, seconds)
+        return response
+
+
+def server_timing(stages, total_seconds) -> str:
+    """Server-Timing header value: one entry per stage (durations summed per stage name) plus total."""
+    totals = defaultdict(float)
+    for stage, seconds in stages:
+        totals[stage] += seconds
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
@@ -0,0 +1,86 @@
+"""
+Dynamic micro-batching for per-request inference calls.
+
+Concurrent callers `submit` single items; the batcher collects them until
+either `max_batch_size` items are waiting or `max_wait_ms` has passed since the
+first one arrived, then runs `process_batch(items)` once in a worker thread and
+hands each caller its own result. A request therefore waits at most one window
+before its batch starts.
+"""
+
+import asyncio
+import contextvars
+
+from metrics import current_request_stages, shared_request_stages
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size=32, max_wait_ms=10.0, pool=None):
+        """
+        process_batch: blocking callable, list of items -> list of results (same order)
+        pool: StagePool that runs process_batch (default: the loop's executor)
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pool = pool
+
+        self._pending = []
+        self._timer = None
+
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, current_request_stages()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_soon(self._flush)
+        asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _, _ in batch]
+        try:
+            # Stage timings of the batch count for every request in it
+            with shared_request_stages([stages for _, _, stages in batch]):
+                if self.pool is not None:
+                    results = await self.pool.run(self.process_batch, items)
+                else:
+                    results = await loop.run_in_executor(None, contextvars.copy_context().run, self.process_batch, items)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(items)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,133 @@
+"""
+Model registry: loads components lazily or in the background and warms them up.
+
+Each component (fusion head, ResNet18, DistilBERT, RoBERTa, ...) has a loader
+and an optional warmup that runs a synthetic inference so graph tracing, lazy
+weight materialization and allocator growth happen before real traffic. An
+engine is ready once every component it depends on is loaded and warm.
+
+MODEL_LOADING selects the strategy:
+- "background" (default): start loading every component at startup on a
+  background thread; the server accepts connections immediately
+- "lazy": load an engine's components on the first request that needs it
+- "eager": load everything before the server starts accepting requests
+"""
+
+import time
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING, LOADING, WARMING, READY, FAILED = "pending", "loading", "warming", "ready", "failed"
+
+
+class Component:
+    def __init__(self, name, loader, warmup=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.state = PENDING
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """Load and warm the component on the calling thread (no-op once ready or failed)."""
+        with self._lock:
+            if self.state in (READY, FAILED):
+                return self.state == READY
+            try:
+                self.state = LOADING
+                start = time.perf_counter()
+                self.loader()
+                self.load_seconds = time.perf_counter() - start
+
+                if self.warmup is not None:
+                    self.state = WARMING
+                    start = time.perf_counter()
+                    self.warmup()
+                    self.warmup_seconds = time.perf_counter() - start
+
+                self.state = READY
+                warm = f", warmup {self.warmup_seconds:.2f}s" if self.warmup_seconds is not None else ""
+                print(f"✅ {self.name} ready (load {self.load_seconds:.2f}s{warm})")
+                return True
+            except Exception as e:
+                self.state = FAILED
+                self.error = str(e)
+                print(f"❌ Error loading {self.name}: {e}")
+                traceback.print_exc()
+                return False
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, mode="background", max_workers=2):
+        self.mode = mode
+        self.components = {}
+        self.engines = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-loader")
+        self._started = time.perf_counter()
+
+    def register(self, name, loader, warmup=None):
+        self.components[name] = Component(name, loader, warmup)
+
+    def define_engine(self, engine, components):
+        self.engines[engine] = list(components)
+
+    # ── Readiness ────────────────────────────────────────────────────────────
+
+    def is_ready(self, engine) -> bool:
+        return all(self.components[c].state == READY for c in self.engines[engine])
+
+    def has_failed(self, engine) -> bool:
+        return any(self.components[c].state == FAILED for c in self.engines[engine])
+
+    def _load_engine(self, engine) -> bool:
+        return all([self.components[c].ensure() for c in self.engines[engine]])
+
+    # ── Loading strategies ───────────────────────────────────────────────────
+
+    def start(self):
+        """Kick off loading according to the configured mode (call from the startup hook)."""
+        if self.mode == "eager":
+            for component in self.components.values():
+                component.ensure()
+        elif self.mode == "background":
+            for component in self.components.values():
+                self._executor.submit(component.ensure)
+
+    async def require(self, engine) -> str:
+        """
+        Return None when `engine` is ready, otherwise a reason it cannot serve yet.
+        In lazy mode the first caller triggers (and waits for) the engine's load.
+        """
+        if self.is_ready(engine):
+            return None
+        if self.has_failed(engine):
+            return "failed"
+        if self.mode == "lazy":
+            loop = asyncio.get_running_loop()
+            ok = await loop.run_in_executor(self._executor, self._load_engine, engine)
+            return None if ok else "failed"
+        return "warming"
+
+    def status(self) -> dict:
+        return {
+            "mode": self.mode,
+            "uptime_seconds": round(time.perf_counter() - self._started, 3),
+            "engines": {engine: self.is_ready(engine) for engine in self.engines},
+            "components": {name: c.status() for name, c in self.components.items()},
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
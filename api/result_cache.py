@@ -0,0 +1,182 @@
+"""
+Content-addressed cache for analysis results.
+
+Results are keyed by the SHA-256 of the uploaded bytes plus the engine name and
+model version, so re-uploading the same clip returns the stored response
+without re-running extraction and inference.
+
+- memory tier: LRU over the most recent `max_entries` results
+- disk tier (optional): one JSON file per key, evicted oldest-first once the
+  directory grows past `disk_max_bytes`
+- single-flight: concurrent requests for the same key share one computation;
+  if the request running it is cancelled (client gone), the others compute
+  from their own uploads instead of failing
+
+Disk reads, writes and eviction run on worker threads, never on the event loop.
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, disk_dir=None, disk_max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._disk_bytes = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.json"))
+
+    @staticmethod
+    def make_key(content_hash: str, engine: str, model_version: str) -> str:
+        return hashlib.sha256(f"{content_hash}:{engine}:{model_version}".encode()).hexdigest()
+
+    # ── Tiers ────────────────────────────────────────────────────────────────
+
+    async def get(self, key: str):
+        """Return the cached result for key, or None. Disk hits are promoted to memory."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        if not self.disk_dir:
+            return None
+        value = await asyncio.to_thread(self._disk_get, key)
+        if value is not None:
+            self._memory_put(key, value)
+            with self._lock:
+                self.hits += 1
+                self.disk_hits += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        """Store in memory now; the disk write (and any eviction) runs in the background on a thread."""
+        self._memory_put(key, value)
+        if self.disk_dir:
+            asyncio.get_running_loop().run_in_executor(None, self._disk_put, key, value)
+
+    def _memory_put(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used for eviction
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self.disk_dir / f"{key}.json"
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+        except OSError as e:
+            print(f"⚠️ Result cache disk write failed: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += size
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier is back under its limit."""
+        files = sorted(self.disk_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        self._disk_bytes = sum(p.stat().st_size for p in files)
+        for path in files:
+            if self._disk_bytes <= self.disk_max_bytes:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+    # ── Single-flight ────────────────────────────────────────────────────────
+
+    async def get_or_compute(self, key: str, compute):
+        """
+        Return (result, cached). `compute` is an async callable producing the
+        result; concurrent callers with the same key await the same computation.
+        Failed computations are not cached and their exception is re-raised to
+        every waiter. When the computation is cancelled (its own request went
+        away), the waiters retry: one of them computes, the others join it.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value, True
+
+        while (inflight := self._inflight.get(key)) is not None:
+            with self._lock:
+                self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight), True
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # this request itself was cancelled
+
+        with self._lock:
+            self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            self.put(key, value)
+            future.set_result(value)
+            return value, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes if self.disk_dir else None,
+            }
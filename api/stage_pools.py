@@ -0,0 +1,118 @@
+"""
+Bounded worker pools for the blocking stages of the inference pipeline.
+
+Each stage (audio extraction, transcription, ResNet, MFCC, DistilBERT, fusion,
+RoBERTa) runs on its own thread pool so a slow stage cannot starve the others
+or the asyncio event loop. Every pool admits at most `max_workers + max_queue`
+outstanding calls; beyond that `run` fails fast with HTTP 503 and a
+Retry-After header instead of letting requests pile up.
+
+Threads rather than processes: the heavy work (torch, TensorFlow, librosa's
+numpy kernels, ffmpeg subprocesses) releases the GIL, and the models are
+module-level objects that would otherwise be loaded once per worker process.
+"""
+
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# How often run_when_free re-checks a saturated pool
+WAIT_POLL_SECONDS = 0.05
+
+
+class StagePool:
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"stage-{name}")
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.max_workers)
+
+    def saturated(self) -> bool:
+        return self.in_flight >= self.capacity
+
+    def check_capacity(self):
+        """Raise the 503 of `run` when the pool is full (for requests that must be refused before they start streaming)."""
+        if self.saturated():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy: '{self.name}' stage is saturated, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this stage's pool, or raise 503 when the pool is full."""
+        self.check_capacity()
+        return await self._submit(fn, *args, **kwargs)
+
+    async def run_when_free(self, fn, *args, **kwargs):
+        """
+        Like `run`, but wait for a free slot instead of failing: for work inside
+        a response that is already streaming and can no longer answer 503.
+        """
+        while self.saturated():
+            await asyncio.sleep(WAIT_POLL_SECONDS)
+        return await self._submit(fn, *args, **kwargs)
+
+    async def _submit(self, fn, *args, **kwargs):
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # run_in_executor does not carry contextvars over; the caller's context (e.g. the
+            # request whose stage timings are being collected) is copied explicitly
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "capacity": self.capacity,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Default (workers, queue) per stage; override with STAGE_<NAME>_WORKERS / STAGE_<NAME>_QUEUE
+_CPUS = os.cpu_count() or 2
+DEFAULT_STAGES = {
+    "audio":  (max(2, _CPUS // 2), 16),   # ffmpeg audio decoding
+    "asr":    (4, 16),                    # speech recognition (network-bound)
+    "video":  (max(1, _CPUS // 4), 4),    # ResNet18 frame features
+    "mfcc":   (max(1, _CPUS // 4), 16),
+    "text":   (max(1, _CPUS // 4), 32),   # DistilBERT embeddings
+    "fusion": (2, 64),
+    "hf":     (max(1, _CPUS // 4), 32),   # RoBERTa pipeline
+}
+
+
+def build_stage_pools(stages=None) -> dict:
+    pools = {}
+    for name, (workers, queue) in (stages or DEFAULT_STAGES).items():
+        workers = int(os.environ.get(f"STAGE_{name.upper()}_WORKERS", workers))
+        queue = int(os.environ.get(f"STAGE_{name.upper()}_QUEUE", queue))
+        pools[name] = StagePool(name, workers, queue)
+    return pools
@@ -0,0 +1,52 @@
+"""
+Request body size limit enforced before the body is read.
+
+With `file: UploadFile = File(...)`, Starlette parses the whole multipart body
+into its own spooled temp file before the endpoint runs, so a size check in the
+endpoint only fires after an oversized upload has been received and written
+to disk. This ASGI middleware sits in front of the parser instead:
+
+- a declared Content-Length above the limit is answered with 413 straight
+  away, without reading the body
+- bodies without one (chunked transfer) are counted as they arrive and the
+  request fails with 413 as soon as the limit is crossed
+"""
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    def _too_large(self):
+        return f"File too large (max {self.max_bytes // (1024 * 1024)} MB)"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        try:
+            declared = int(declared) if declared is not None else None
+        except ValueError:
+            declared = None
+        if declared is not None and declared > self.max_bytes:
+            response = JSONResponse({"detail": self._too_large()}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the endpoint's body parsing, so FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail=self._too_large())
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,7 +1,23 @@
+"""
+Multimodal fusion model: dataset assembly, training and evaluation.
+
+Importable pipeline; `python -m models.multimodal_model` runs the full
+training exactly as before (same split, scalers, architecture and artifacts).
+
+- Features come from the memory-mapped feature store when it has been built
+  (preprocessing/feature_store.py), else from the pickled dicts.
+- Labels are joined to features with a vectorized index join (pandas
+  Index.get_indexer) instead of a per-row dict lookup, and the joined dataset
+  is a set of row numbers into each modality's matrix, not a stacked copy.
+- Scalers are fitted in chunks (StandardScaler.partial_fit) and Keras is fed
+  by a prefetching tf.data pipeline that gathers and scales one batch of rows
+  at a time, so only the batches in flight are ever materialized.
+"""
+
+import os
 import pickle
 import pandas as pd
 import numpy as np
-import seaborn as sns
 from collections import Counter  # For checking label distribution
 
 # --- Scikit-learn imports ---
@@ -14,167 +30,232 @@ from sklearn.utils.class_weight import compute_class_weight
 import tensorflow as tf
 from tensorflow.keras.models import Model # type: ignore
 from tensorflow.keras.layers import Input, Dense, Concatenate, Dropout # type: ignore
-from tensorflow.keras.utils import to_categorical # type: ignore
 from tensorflow.keras.optimizers import Adam # type: ignore
 from tensorflow.keras.callbacks import EarlyStopping # type: ignore
 
-# +++ Add import for plotting +++
-import matplotlib.pyplot as plt
-# --- End Add ---
+from preprocessing.feature_store import STORE_DIR, PICKLE_PATHS, load_features
+
+MODALITIES = ('audio', 'video', 'text')
+LABELS_PATH = 'data/processed_dataset.csv'
+MODEL_DIR = 'models'
+
+BATCH_SIZE = 32
+SCALER_CHUNK_ROWS = 8192
 
-print(f"Using TensorFlow version: {tf.__version__}")
 
 # ------------------ Load Features ------------------
-print("\n--- Loading Features ---")
-try:
-    with open('data/mini_dataset/mini_audio_features.pkl', 'rb') as f:
-        audio_features = pickle.load(f)
-    print(f"✅ audio_features loaded: {len(audio_features)} entries")
-
-    with open('data/mini_dataset/mini_video_features.pkl', 'rb') as f:
-        video_features = pickle.load(f)
-    print(f"✅ video_features loaded: {len(video_features)} entries")
-
-    with open('data/mini_dataset/mini_text_features.pkl', 'rb') as f:
-        text_features = pickle.load(f)
-    print(f"✅ text_features loaded: {len(text_features)} entries")
-
-    df = pd.read_csv('data/processed_dataset.csv')
-    print(f"🟡 Rows in CSV: {len(df)}")
-
-except FileNotFoundError as e:
-    print(f"❌ Error loading data files: {e}")
-    exit()
-except Exception as e:
-    print(f"❌ Unexpected error: {e}")
-    exit()
+
+def feature_matrix(features):
+    """
+    (clip ids, matrix) for one modality. Feature-store views are returned as is
+    (the matrix stays memory-mapped); a legacy pickled dict is stacked once.
+    """
+    if hasattr(features, 'matrix'):
+        return list(features.clip_ids), features.matrix
+    clip_ids = list(features)
+    return clip_ids, np.stack([np.asarray(features[c]) for c in clip_ids])
+
+
+def load_modalities(store_dir=STORE_DIR):
+    """{modality: (clip ids, matrix)} from the feature store or the pickles."""
+    matrices = {}
+    for name in MODALITIES:
+        clip_ids, matrix = feature_matrix(load_features(name, store_dir, PICKLE_PATHS[name]))
+        matrices[name] = (clip_ids, matrix)
+        print(f"✅ {name}_features loaded: {len(clip_ids)} entries")
+    return matrices
+
 
 # ------------------ Match and Prepare Data ------------------
-print("\n--- Matching Features and Labels ---")
-audio_data, video_data, text_data, labels = [], [], [], []
 
-required_columns = ['video_id', 'clip_id', 'annotation']
-if not all(col in df.columns for col in required_columns):
-    print(f"❌ CSV missing required columns: {required_columns}")
-    exit()
+def clip_keys(df):
+    """'<video_id>_<clip_id>' per CSV row; rows whose clip_id is not an integer get None."""
+    clip_num = pd.to_numeric(df['clip_id'], errors='coerce')
+    valid = clip_num.notna() & np.isfinite(clip_num)
+    keys = pd.Series(None, index=df.index, dtype=object)
+    keys[valid] = df.loc[valid, 'video_id'].astype(str) + '_' + clip_num[valid].astype(np.int64).astype(str)
+    return keys
+
+
+def join_labels(df, matrices):
+    """
+    Vectorized join of CSV rows to feature rows.
+    Returns ({modality: row numbers into its matrix}, labels) for the CSV rows
+    present in every modality, in CSV order.
+    """
+    required_columns = ['video_id', 'clip_id', 'annotation']
+    if not all(col in df.columns for col in required_columns):
+        raise ValueError(f"CSV missing required columns: {required_columns}")
+
+    keys = clip_keys(df)
+    positions = {name: pd.Index(clip_ids).get_indexer(keys) for name, (clip_ids, _) in matrices.items()}
+    matched = keys.notna().to_numpy() & np.logical_and.reduce([pos >= 0 for pos in positions.values()])
+    rows = {name: pos[matched] for name, pos in positions.items()}
+    return rows, df['annotation'].to_numpy()[matched].astype(str)
 
-for _, row in df.iterrows():
-    try:
-        key = f"{row['video_id']}_{int(row['clip_id'])}"
-    except:
-        continue
-    if key in audio_features and key in video_features and key in text_features:
-        audio_data.append(np.asarray(audio_features[key]))
-        video_data.append(np.asarray(video_features[key]))
-        text_data.append(np.asarray(text_features[key]))
-        labels.append(row['annotation'])
-
-print(f"🟢 Total matched clips: {len(labels)}")
-print("📊 Label distribution:", Counter(labels))
-
-# ------------------ Encode Labels ------------------
-print("\n--- Encoding Labels ---")
-le = LabelEncoder()
-y_int = le.fit_transform(labels)
-y = to_categorical(y_int)
-num_classes = len(le.classes_)
-
-# ------------------ Stack Features ------------------
-X_a = np.stack(audio_data)
-X_v = np.stack(video_data)
-X_t = np.stack(text_data)
-print(f"🔢 Feature shapes: Audio={X_a.shape}, Video={X_v.shape}, Text={X_t.shape}, Labels={y.shape}")
-
-# ------------------ Compute Class Weights ------------------
-class_weights = compute_class_weight('balanced', classes=np.unique(y_int), y=y_int)
-class_weight_dict = dict(enumerate(class_weights))
-print("⚖️ Class weights:", class_weight_dict)
-
-# ------------------ Train/Test Split ------------------
-X_a_train, X_a_test, X_v_train, X_v_test, X_t_train, X_t_test, y_train, y_test = train_test_split(
-    X_a, X_v, X_t, y, test_size=0.2, random_state=42, stratify=y_int
-)
 
 # ------------------ Scale Features ------------------
-scaler_a, scaler_v, scaler_t = StandardScaler(), StandardScaler(), StandardScaler()
-X_a_train = scaler_a.fit_transform(X_a_train)
-X_v_train = scaler_v.fit_transform(X_v_train)
-X_t_train = scaler_t.fit_transform(X_t_train)
-X_a_test = scaler_a.transform(X_a_test)
-X_v_test = scaler_v.transform(X_v_test)
-X_t_test = scaler_t.transform(X_t_test)
 
-# In multimodal_model.py, after fitting/applying scalers:
+def fit_scaler(matrix, rows, chunk_rows=SCALER_CHUNK_ROWS):
+    """StandardScaler fitted on matrix[rows], reading chunk_rows rows at a time."""
+    scaler = StandardScaler()
+    for start in range(0, len(rows), chunk_rows):
+        chunk = np.sort(rows[start:start + chunk_rows])
+        scaler.partial_fit(np.asarray(matrix[chunk], dtype=np.float64))
+    return scaler
+
+
+# ------------------ tf.data input ------------------
 
-print("\n--- Saving Scalers ---")
-with open('models/scaler_audio.pkl', 'wb') as f:
-    pickle.dump(scaler_a, f)
-print("💾 Audio scaler saved to models/scaler_audio.pkl")
+def make_dataset(matrices, rows, y, scalers, sample_idx, batch_size=BATCH_SIZE, shuffle=False, seed=42):
+    """
+    tf.data pipeline over the samples `sample_idx`: each batch gathers its rows
+    from every modality's (possibly memory-mapped) matrix, applies the scalers
+    and yields ((audio, video, text), y). Batches are prefetched in parallel.
+    """
+    dims = [matrices[name][1].shape[1] for name in MODALITIES]
+    means = [scalers[name].mean_.astype(np.float32) for name in MODALITIES]
+    scales = [scalers[name].scale_.astype(np.float32) for name in MODALITIES]
+    y = y.astype(np.float32)
 
-with open('models/scaler_video.pkl', 'wb') as f:
-    pickle.dump(scaler_v, f)
-print("💾 Video scaler saved to models/scaler_video.pkl")
+    def gather(batch):
+        out = []
+        for name, mean, scale in zip(MODALITIES, means, scales):
+            feature_rows = rows[name][batch]
+            order = np.argsort(feature_rows)   # sequential reads from the memory map
+            x = np.empty((len(batch), mean.shape[0]), dtype=np.float32)
+            x[order] = matrices[name][1][feature_rows[order]]
+            out.append((x - mean) / scale)
+        return (*out, y[batch])
+
+    def load(batch):
+        *xs, labels = tf.numpy_function(gather, [batch], [tf.float32] * (len(MODALITIES) + 1))
+        for x, dim in zip(xs, dims):
+            x.set_shape([None, dim])
+        labels.set_shape([None, y.shape[1]])
+        return tuple(xs), labels
+
+    ds = tf.data.Dataset.from_tensor_slices(np.asarray(sample_idx, dtype=np.int64))
+    if shuffle:
+        ds = ds.shuffle(len(sample_idx), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size).map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    return ds.prefetch(tf.data.AUTOTUNE)
 
-with open('models/scaler_text.pkl', 'wb') as f:
-    pickle.dump(scaler_t, f)
-print("💾 Text scaler saved to models/scaler_text.pkl")
 
 # ------------------ Build Sub-networks ------------------
-print("\n--- Building Model Architecture ---")
+
 def build_ffnn(dim, prefix):
     inp = Input(shape=(dim,), name=f"{prefix}_in")
     x = Dense(64, activation='relu', name=f"{prefix}_dense")(inp)
     x = Dropout(0.3, name=f"{prefix}_drop")(x)
     return inp, x
 
-inp_a, out_a = build_ffnn(X_a_train.shape[1], 'audio')
-inp_v, out_v = build_ffnn(X_v_train.shape[1], 'video')
-inp_t, out_t = build_ffnn(X_t_train.shape[1], 'text')
-
-# ------------------ Fusion and Final Model ------------------
-merged = Concatenate(name='fusion_concat')([out_a, out_v, out_t])
-x = Dense(64, activation='relu', name='fusion_dense')(merged)
-x = Dropout(0.3, name='fusion_drop')(x)
-# Output logits without softmax
-tokens = Dense(num_classes, activation=None, name='output_logits')(x)
-
-model = Model(inputs=[inp_a, inp_v, inp_t], outputs=tokens)
-model.compile(
-    optimizer=Adam(0.0005),
-    loss=tf.keras.losses.CategoricalCrossentropy(from_logits=True),
-    metrics=['accuracy']
-)
-print("✅ Model compiled.\n")
-model.summary()
-
-# ------------------ Train ------------------
-print("\n--- Training ---")
-eh = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
-model.fit(
-    [X_a_train, X_v_train, X_t_train], y_train,
-    validation_split=0.1, epochs=100, batch_size=32,
-    class_weight=class_weight_dict, callbacks=[eh]
-)
-
-# ------------------ Evaluate ------------------
-print("\n--- Evaluating ---")
-loss, acc = model.evaluate([X_a_test, X_v_test, X_t_test], y_test)
-print(f"Test loss: {loss:.4f}, Test acc: {acc:.4f}")
-
-y_pred = model.predict([X_a_test, X_v_test, X_t_test])
-y_pred_labels = np.argmax(y_pred, axis=1)
-y_true_labels = np.argmax(y_test, axis=1)
-
-print(classification_report(y_true_labels, y_pred_labels, target_names=le.classes_))
-cm = confusion_matrix(y_true_labels, y_pred_labels)
-Disp = ConfusionMatrixDisplay(cm, display_labels=le.classes_)
-plt.figure(figsize=(6,5))
-Disp.plot(ax=plt.gca())
-plt.title('Confusion Matrix')
-plt.show()
-
-# ------------------ Save Model + Encoder ------------------
-model.save('models/final_multimodal_logits_model.h5')
-with open('models/label_encoder.pkl','wb') as f:
-    pickle.dump(le, f)
-print("💾 Model & encoder saved.")
\ No newline at end of file
+
+def build_model(dims, num_classes):
+    """Fusion model over {modality: input dim}; outputs logits (no softmax)."""
+    inp_a, out_a = build_ffnn(dims['audio'], 'audio')
+    inp_v, out_v = build_ffnn(dims['video'], 'video')
+    inp_t, out_t = build_ffnn(dims['text'], 'text')
+
+    merged = Concatenate(name='fusion_concat')([out_a, out_v, out_t])
+    x = Dense(64, activation='relu', name='fusion_dense')(merged)
+    x = Dropout(0.3, name='fusion_drop')(x)
+    # Output logits without softmax
+    tokens = Dense(num_classes, activation=None, name='output_logits')(x)
+
+    model = Model(inputs=[inp_a, inp_v, inp_t], outputs=tokens)
+    model.compile(
+        optimizer=Adam(0.0005),
+        loss=tf.keras.losses.CategoricalCrossentropy(from_logits=True),
+        metrics=['accuracy']
+    )
+    return model
+
+
+# ------------------ Train / Evaluate ------------------
+
+def main(store_dir=STORE_DIR, labels_path=LABELS_PATH, show_plot=True):
+    print(f"Using TensorFlow version: {tf.__version__}")
+
+    print("\n--- Loading Features ---")
+    try:
+        matrices = load_modalities(store_dir)
+        df = pd.read_csv(labels_path)
+        print(f"🟡 Rows in CSV: {len(df)}")
+    except FileNotFoundError as e:
+        print(f"❌ Error loading data files: {e}")
+        return None
+
+    print("\n--- Matching Features and Labels ---")
+    rows, labels = join_labels(df, matrices)
+    print(f"🟢 Total matched clips: {len(labels)}")
+    print("📊 Label distribution:", Counter(labels))
+
+    print("\n--- Encoding Labels ---")
+    le = LabelEncoder()
+    y_int = le.fit_transform(labels)
+    num_classes = len(le.classes_)
+    y = np.eye(num_classes, dtype=np.float32)[y_int]
+    dims = {name: matrices[name][1].shape[1] for name in MODALITIES}
+    print(f"🔢 Feature dims: {dims}, Samples={len(y)}")
+
+    class_weights = compute_class_weight('balanced', classes=np.unique(y_int), y=y_int)
+    class_weight_dict = dict(enumerate(class_weights))
+    print("⚖️ Class weights:", class_weight_dict)
+
+    # Same split as before: the sample order is the CSV order and random_state is fixed
+    train_idx, test_idx = train_test_split(
+        np.arange(len(y)), test_size=0.2, random_state=42, stratify=y_int
+    )
+    # Keras' validation_split=0.1 took the last 10% of the training arrays
+    split_at = int(len(train_idx) * (1 - 0.1))
+    fit_idx, val_idx = train_idx[:split_at], train_idx[split_at:]
+
+    print("\n--- Saving Scalers ---")
+    scalers = {name: fit_scaler(matrices[name][1], rows[name][train_idx]) for name in MODALITIES}
+    for name in MODALITIES:
+        path = os.path.join(MODEL_DIR, f'scaler_{name}.pkl')
+        with open(path, 'wb') as f:
+            pickle.dump(scalers[name], f)
+        print(f"💾 {name.capitalize()} scaler saved to {path}")
+
+    train_ds = make_dataset(matrices, rows, y, scalers, fit_idx, shuffle=True)
+    val_ds = make_dataset(matrices, rows, y, scalers, val_idx)
+    test_ds = make_dataset(matrices, rows, y, scalers, test_idx)
+
+    print("\n--- Building Model Architecture ---")
+    model = build_model(dims, num_classes)
+    print("✅ Model compiled.\n")
+    model.summary()
+
+    print("\n--- Training ---")
+    eh = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
+    model.fit(train_ds, validation_data=val_ds, epochs=100, class_weight=class_weight_dict, callbacks=[eh])
+
+    print("\n--- Evaluating ---")
+    loss, acc = model.evaluate(test_ds)
+    print(f"Test loss: {loss:.4f}, Test acc: {acc:.4f}")
+
+    y_pred_labels = np.argmax(model.predict(test_ds), axis=1)
+    y_true_labels = y_int[test_idx]
+
+    print(classification_report(y_true_labels, y_pred_labels, target_names=le.classes_))
+    if show_plot:
+        import matplotlib.pyplot as plt
+        cm = confusion_matrix(y_true_labels, y_pred_labels)
+        Disp = ConfusionMatrixDisplay(cm, display_labels=le.classes_)
+        plt.figure(figsize=(6,5))
+        Disp.plot(ax=plt.gca())
+        plt.title('Confusion Matrix')
+        plt.show()
+
+    # ------------------ Save Model + Encoder ------------------
+    model.save(os.path.join(MODEL_DIR, 'final_multimodal_logits_model.h5'))
+    with open(os.path.join(MODEL_DIR, 'label_encoder.pkl'), 'wb') as f:
+        pickle.dump(le, f)
+    print("💾 Model & encoder saved.")
+    return model
+
+
+if __name__ == '__main__':
+    main()
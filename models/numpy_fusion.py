@@ -0,0 +1,225 @@
+"""
+NumPy inference engine for the multimodal fusion head.
+
+The fusion network trained in models/multimodal_model.py is small:
+
+    audio -> Dense(64, relu) ─┐
+    video -> Dense(64, relu) ─┼─ concat -> Dense(64, relu) -> Dense(n_classes)
+    text  -> Dense(64, relu) ─┘
+
+(Dropout is the identity at inference.) `export` copies its weights, the three
+StandardScalers and the label classes into one .npz, and `NumpyFusion`
+evaluates it with a handful of batched matmuls, so serving needs neither
+TensorFlow nor the per-call overhead of `model.predict`.
+
+Each scaler is also folded into its branch's first Dense layer, so
+`predict_raw` goes straight from unscaled features to logits:
+
+    relu(((x - mean) / scale) @ W + b) == relu(x @ (W / scale[:, None]) + (b - (mean / scale) @ W))
+
+The API represents a missing modality (no video in an audio upload, no audio
+or video for raw text) as an all-zero scaled input. That branch's activation is
+then the constant relu(b), so `predict_modalities` folds the absent branches'
+contribution into the fusion bias once per availability pattern and only
+evaluates the branches that are present.
+
+Usage:
+    python -m models.numpy_fusion export   # writes models/fusion_numpy.npz
+    python -m models.numpy_fusion check    # parity against the Keras model
+"""
+
+import os
+import sys
+import pickle
+import numpy as np
+
+MODEL_DIR = 'models'
+KERAS_MODEL_PATH = os.path.join(MODEL_DIR, 'final_multimodal_logits_model.h5')
+EXPORT_PATH = os.path.join(MODEL_DIR, 'fusion_numpy.npz')
+
+# Input order of the Keras model, and the prefix of each branch's layers
+MODALITIES = ('audio', 'video', 'text')
+PARITY_TOLERANCE = 1e-3
+
+
+def export(keras_path=KERAS_MODEL_PATH, model_dir=MODEL_DIR, out_path=EXPORT_PATH):
+    """Export Keras weights, scalers and label classes to a single .npz (needs TensorFlow)."""
+    from tensorflow.keras.models import load_model  # type: ignore
+
+    keras_model = load_model(keras_path)
+    arrays = {}
+    for name in MODALITIES:
+        W, b = keras_model.get_layer(f'{name}_dense').get_weights()
+        arrays[f'{name}_W'], arrays[f'{name}_b'] = W, b
+        with open(os.path.join(model_dir, f'scaler_{name}.pkl'), 'rb') as f:
+            scaler = pickle.load(f)
+        arrays[f'{name}_mean'] = scaler.mean_
+        arrays[f'{name}_scale'] = scaler.scale_
+    arrays['fusion_W'], arrays['fusion_b'] = keras_model.get_layer('fusion_dense').get_weights()
+    arrays['logits_W'], arrays['logits_b'] = keras_model.get_layer('output_logits').get_weights()
+
+    with open(os.path.join(model_dir, 'label_encoder.pkl'), 'rb') as f:
+        arrays['classes'] = np.asarray(pickle.load(f).classes_, dtype=str)
+
+    np.savez(out_path, **arrays)
+    print(f"💾 NumPy fusion weights exported to {out_path}")
+    return out_path
+
+
+class NumpyFusion:
+    def __init__(self, path=EXPORT_PATH, dtype=np.float32):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+
+        self.dtype = dtype
+        self.classes_ = arrays['classes']
+        self.mean = {}
+        self.scale = {}
+        self.W = {}
+        self.b = {}
+        self.W_raw = {}
+        self.b_raw = {}
+        for name in MODALITIES:
+            W = arrays[f'{name}_W'].astype(np.float64)
+            b = arrays[f'{name}_b'].astype(np.float64)
+            mean = arrays[f'{name}_mean'].astype(np.float64)
+            scale = arrays[f'{name}_scale'].astype(np.float64)
+            self.mean[name], self.scale[name] = mean.astype(dtype), scale.astype(dtype)
+            self.W[name], self.b[name] = W.astype(dtype), b.astype(dtype)
+            # Scaler folded into the first layer (computed in float64, then cast)
+            self.W_raw[name] = (W / scale[:, None]).astype(dtype)
+            self.b_raw[name] = (b - (mean / scale) @ W).astype(dtype)
+
+        self.fusion_W = arrays['fusion_W'].astype(dtype)
+        self.fusion_b = arrays['fusion_b'].astype(dtype)
+        self.logits_W = arrays['logits_W'].astype(dtype)
+        self.logits_b = arrays['logits_b'].astype(dtype)
+
+        self.input_dims = {name: self.W[name].shape[0] for name in MODALITIES}
+
+        # Rows of fusion_W fed by each branch (concat order is MODALITIES)
+        self.fusion_rows = {}
+        offset = 0
+        for name in MODALITIES:
+            width = self.W[name].shape[1]
+            self.fusion_rows[name] = self.fusion_W[offset:offset + width]
+            offset += width
+        self._pattern_bias = {}
+
+    def _head(self, hidden):
+        """Concatenated branch activations -> logits."""
+        h = np.maximum(hidden @ self.fusion_W + self.fusion_b, 0)
+        return h @ self.logits_W + self.logits_b
+
+    def predict(self, inputs, verbose=0):
+        """Logits for scaled [audio, video, text] batches (drop-in for keras Model.predict)."""
+        hidden = np.concatenate([
+            np.maximum(np.asarray(x, dtype=self.dtype) @ self.W[name] + self.b[name], 0)
+            for name, x in zip(MODALITIES, inputs)
+        ], axis=1)
+        return self._head(hidden)
+
+    def predict_raw(self, audio, video, text):
+        """Logits for unscaled feature batches, using the scaler-folded first layers."""
+        hidden = np.concatenate([
+            np.maximum(np.asarray(x, dtype=self.dtype) @ self.W_raw[name] + self.b_raw[name], 0)
+            for name, x in zip(MODALITIES, (audio, video, text))
+        ], axis=1)
+        return self._head(hidden)
+
+    def _fusion_bias(self, present):
+        """Fusion bias with the constant contribution of every absent branch folded in."""
+        key = frozenset(present)
+        bias = self._pattern_bias.get(key)
+        if bias is None:
+            bias = self.fusion_b.astype(np.float64)
+            for name in MODALITIES:
+                if name not in key:
+                    bias = bias + np.maximum(self.b[name], 0).astype(np.float64) @ self.fusion_rows[name]
+            bias = bias.astype(self.dtype)
+            self._pattern_bias[key] = bias
+        return bias
+
+    def predict_modalities(self, audio=None, video=None, text=None, raw=False):
+        """
+        Logits when only some modalities are available; None marks an absent one
+        (equivalent to feeding zeros for its scaled features to `predict`). Only the
+        present branches are evaluated. With raw=True the inputs are unscaled and
+        go through the scaler-folded first layers.
+        """
+        inputs = {name: x for name, x in zip(MODALITIES, (audio, video, text)) if x is not None}
+        if not inputs:
+            raise ValueError("At least one modality is required")
+        W, b = (self.W_raw, self.b_raw) if raw else (self.W, self.b)
+
+        pre = self._fusion_bias(inputs)
+        for name, x in inputs.items():
+            h = np.maximum(np.asarray(x, dtype=self.dtype) @ W[name] + b[name], 0)
+            pre = pre + h @ self.fusion_rows[name]
+        h = np.maximum(pre, 0)
+        return h @ self.logits_W + self.logits_b
+
+    def warmup(self):
+        """Precompute the fusion bias for the availability patterns the API serves."""
+        for present in (('text',), ('audio', 'text'), ('audio',), ('audio', 'video'), MODALITIES):
+            self._fusion_bias(present)
+
+    def scale_features(self, name, x):
+        """StandardScaler.transform for one modality."""
+        return (np.asarray(x, dtype=self.dtype) - self.mean[name]) / self.scale[name]
+
+
+def check_parity(n_random=256, tolerance=PARITY_TOLERANCE):
+    """
+    Compare NumpyFusion against the Keras model on random scaled inputs and on
+    the mini dataset features. Returns the max absolute logit difference and
+    raises AssertionError past `tolerance` or on an argmax disagreement that is
+    not a tie.
+    """
+    from tensorflow.keras.models import load_model  # type: ignore
+
+    keras_model = load_model(KERAS_MODEL_PATH)
+    engine = NumpyFusion()
+    rng = np.random.default_rng(0)
+
+    scaled = [rng.standard_normal((n_random, engine.input_dims[name])) for name in MODALITIES]
+    batches = [('random scaled', scaled, engine.predict(scaled))]
+
+    feature_paths = {name: f'data/mini_dataset/mini_{name}_features.pkl' for name in MODALITIES}
+    if all(os.path.exists(p) for p in feature_paths.values()):
+        features = {}
+        for name, path in feature_paths.items():
+            with open(path, 'rb') as f:
+                features[name] = pickle.load(f)
+        clip_ids = sorted(set.intersection(*(set(f) for f in features.values())))
+        raw = [np.stack([features[name][c] for c in clip_ids]) for name in MODALITIES]
+        scaled = [engine.scale_features(name, x) for name, x in zip(MODALITIES, raw)]
+        batches.append(('mini dataset (scaled)', scaled, engine.predict(scaled)))
+        batches.append(('mini dataset (folded raw)', scaled, engine.predict_raw(*raw)))
+
+    worst = 0.0
+    for label, scaled, numpy_logits in batches:
+        keras_logits = keras_model.predict([np.asarray(x, dtype=np.float32) for x in scaled], verbose=0)
+        diff = float(np.max(np.abs(keras_logits - numpy_logits)))
+        agree = np.argmax(keras_logits, 1) == np.argmax(numpy_logits, 1)
+        # Rows whose top two Keras logits are within tolerance are ties either way
+        top2 = np.sort(keras_logits, axis=1)[:, -2:]
+        decisive = (top2[:, 1] - top2[:, 0]) > 2 * tolerance
+        print(f"{label:<28} rows={len(numpy_logits):<5} max|Δlogit|={diff:.2e}  "
+              f"argmax agreement={np.mean(agree):.2%}")
+        assert diff <= tolerance, f"{label}: max logit difference {diff:.2e} exceeds {tolerance:.0e}"
+        assert np.all(agree | ~decisive), f"{label}: argmax disagreement on a non-tied row"
+        worst = max(worst, diff)
+
+    print("✅ NumPy fusion matches Keras")
+    return worst
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'export'
+    if command == 'export':
+        export()
+    elif command == 'check':
+        check_parity()
+    else:
+        sys.exit(f"Unknown command {command!r}; use 'export' or 'check'")
@@ -0,0 +1,216 @@
+"""
+Parity harness for the optimized backends in preprocessing/optimized_backends.py.
+
+Every (model, backend) pair runs in a fresh process, so load time and memory
+are measured in isolation, over the mini dataset (segmented transcripts for
+DistilBERT and RoBERTa, segmented clips for ResNet18). Against the fp32
+backend it reports:
+- load time, resident memory after load and peak RSS
+- mean / p95 latency per item and speed-up
+- DistilBERT / ResNet18: cosine similarity of the features, and agreement of
+  the fusion model's label when that feature is swapped in (the other two
+  modalities come from the mini dataset pickles)
+- RoBERTa: label agreement and max |Δ probability|
+
+Usage:
+    python -m preprocessing.optimized_backends export
+    python -m preprocessing.benchmark_backends --limit 100
+    python -m preprocessing.benchmark_backends --models distilbert --backends fp32 int8
+"""
+
+import os
+import time
+import pickle
+import argparse
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from preprocessing.optimized_backends import BACKENDS, ROBERTA_MODEL_NAME, onnx_path
+
+TEXT_FOLDER = 'data/mini_dataset/segmented_transcripts'
+VIDEO_FOLDER = 'data/mini_dataset/segmented_video'
+FEATURE_PATHS = {name: f'data/mini_dataset/mini_{name}_features.pkl' for name in ('audio', 'video', 'text')}
+
+# Environment variable selecting each model's backend, and its modality in the fusion model
+MODELS = {
+    'distilbert': ('TEXT_BACKEND', 'text'),
+    'resnet18': ('VIDEO_BACKEND', 'video'),
+    'roberta': ('HF_BACKEND', None),
+}
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(model, backend, items, video_policy):
+    """Runs in a fresh process: load `model` with `backend`, return outputs and measurements."""
+    os.environ[MODELS[model][0]] = backend
+    rss_start = _rss_mb()
+    start = time.perf_counter()
+
+    if model == 'distilbert':
+        from preprocessing.extract_all_text_features import load_text_model, warmup, extract_text_features
+        load_text_model()
+        run = lambda text: extract_text_features(text, use_memo=False)
+    elif model == 'resnet18':
+        from preprocessing.extract_all_video_features import (
+            load_resnet, warmup, extract_all_video_features, SAMPLING_POLICIES
+        )
+        load_resnet()
+        run = lambda path: extract_all_video_features(path, **SAMPLING_POLICIES[video_policy])
+    else:
+        from preprocessing.optimized_backends import load_text_classifier
+        classifier = load_text_classifier(ROBERTA_MODEL_NAME, backend)
+        warmup = lambda: classifier(["warming up the sentiment pipeline"])
+
+        def run(text):
+            scores = {s['label']: s['score'] for s in classifier([text])[0]}
+            return np.array([scores[label] for label in sorted(scores)], dtype=np.float32)
+
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _rss_mb()
+    warmup()
+
+    outputs, latencies = [], []
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(run(item))
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        'outputs': outputs,
+        'latencies': latencies,
+        'load_seconds': load_seconds,
+        'model_mb': rss_loaded - rss_start,
+        'peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_isolated(model, backend, items, video_policy):
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_measure, model, backend, items, video_policy).result()
+
+
+def _cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+
+def _fusion_labeler():
+    """Function (audio, video, text raw feature batches) -> labels, or None if the fusion model is unavailable."""
+    try:
+        from models.numpy_fusion import NumpyFusion, EXPORT_PATH, MODALITIES
+        features = {}
+        for name, path in FEATURE_PATHS.items():
+            with open(path, 'rb') as f:
+                features[name] = pickle.load(f)
+        if os.path.exists(EXPORT_PATH):
+            engine = NumpyFusion()
+            predict = engine.predict_raw
+            classes = engine.classes_
+        else:
+            from tensorflow.keras.models import load_model  # type: ignore
+            keras_model = load_model(os.path.join('models', 'final_multimodal_logits_model.h5'))
+            scalers = {}
+            for name in MODALITIES:
+                with open(os.path.join('models', f'scaler_{name}.pkl'), 'rb') as f:
+                    scalers[name] = pickle.load(f)
+            with open(os.path.join('models', 'label_encoder.pkl'), 'rb') as f:
+                classes = pickle.load(f).classes_
+            predict = lambda *raw: keras_model.predict(
+                [scalers[name].transform(x) for name, x in zip(MODALITIES, raw)], verbose=0)
+        return features, lambda a, v, t: classes[np.argmax(predict(a, v, t), axis=1)]
+    except Exception as e:
+        print(f"⚠️ Fusion model unavailable, skipping label agreement for extractors: {e}")
+        return None
+
+
+def _inputs(model, limit):
+    """(clip ids, items) for a model: transcript texts or video paths from the mini dataset."""
+    if model == 'resnet18':
+        clip_ids = sorted(f[:-4] for f in os.listdir(VIDEO_FOLDER) if f.endswith('.mp4'))[:limit]
+        return clip_ids, [os.path.join(VIDEO_FOLDER, f'{c}.mp4') for c in clip_ids]
+    clip_ids = sorted(f[:-4] for f in os.listdir(TEXT_FOLDER) if f.endswith('.txt'))[:limit]
+    texts = []
+    for clip_id in clip_ids:
+        with open(os.path.join(TEXT_FOLDER, f'{clip_id}.txt'), encoding='utf-8') as f:
+            texts.append(f.read())
+    return clip_ids, texts
+
+
+def _agreement(model, clip_ids, reference, outputs, fusion):
+    """(similarity column, label agreement) of `outputs` versus the fp32 `reference`."""
+    pairs = [(c, r, o) for c, r, o in zip(clip_ids, reference, outputs) if r is not None and o is not None]
+    if not pairs:
+        return float('nan'), float('nan')
+
+    if model == 'roberta':
+        max_diff = max(float(np.max(np.abs(r - o))) for _, r, o in pairs)
+        return max_diff, float(np.mean([np.argmax(r) == np.argmax(o) for _, r, o in pairs]))
+
+    cosine = float(np.mean([_cosine(r, o) for _, r, o in pairs]))
+    if fusion is None:
+        return cosine, float('nan')
+    features, label = fusion
+    modality = MODELS[model][1]
+    scored = [(c, r, o) for c, r, o in pairs if all(c in features[m] for m in features)]
+    if not scored:
+        return cosine, float('nan')
+
+    def labels(swapped):
+        batch = {m: np.stack([features[m][c] for c, _, _ in scored]) for m in features}
+        batch[modality] = np.stack(swapped)
+        return label(batch['audio'], batch['video'], batch['text'])
+
+    agree = labels([r for _, r, _ in scored]) == labels([o for _, _, o in scored])
+    return cosine, float(np.mean(agree))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=100, help='number of clips / transcripts per model')
+    parser.add_argument('--models', nargs='*', default=list(MODELS), choices=list(MODELS))
+    parser.add_argument('--backends', nargs='*', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--video-policy', default='fps_2', help='sampling policy for the ResNet18 runs')
+    args = parser.parse_args()
+
+    fusion = _fusion_labeler() if set(args.models) & {'distilbert', 'resnet18'} else None
+
+    for model in args.models:
+        clip_ids, items = _inputs(model, args.limit)
+        backends = ['fp32'] + [b for b in args.backends if b != 'fp32' and not (model == 'resnet18' and b == 'int8')]
+        print(f"\n▶ {model}: {len(items)} items")
+        print(f"{'backend':<10} {'load s':>7} {'model MB':>9} {'peak MB':>8} {'ms/item':>8} {'p95 ms':>7} "
+              f"{'speedup':>8} {'onnx MB':>8} {'cos/Δp':>8} {'labels':>7}")
+
+        reference = None
+        for backend in backends:
+            try:
+                result = _run_isolated(model, backend, items, args.video_policy)
+            except Exception as e:
+                print(f"{backend:<10} skipped: {e}")
+                continue
+
+            latencies = np.array(result['latencies']) * 1000
+            if reference is None:
+                reference = result
+            similarity, labels = _agreement(model, clip_ids, reference['outputs'], result['outputs'], fusion)
+            speedup = np.mean(reference['latencies']) / np.mean(result['latencies'])
+            size = float('nan')
+            if backend.startswith('onnx'):
+                size = os.path.getsize(onnx_path(model, backend == 'onnx_int8')) / 2**20
+            print(f"{backend:<10} {result['load_seconds']:>7.2f} {result['model_mb']:>9.0f} "
+                  f"{result['peak_mb']:>8.0f} {np.mean(latencies):>8.1f} {np.percentile(latencies, 95):>7.1f} "
+                  f"{speedup:>7.2f}x {size:>8.1f} {similarity:>8.4f} {labels:>7.2%}")
+
+
+if __name__ == '__main__':
+    main()
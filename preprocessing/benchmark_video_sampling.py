@@ -0,0 +1,112 @@
+"""
+Compare the video frame sampling policies in extract_all_video_features.
+
+For every policy in SAMPLING_POLICIES this reports, over the segmented clips:
+- mean extraction time per clip and speed-up versus embedding every frame
+- cosine similarity of the clip feature to the every-frame feature
+- accuracy / agreement of the fusion model when the video feature is swapped
+  for the sampled one (audio and text features come from the mini dataset)
+
+Usage:
+    python -m preprocessing.benchmark_video_sampling --limit 50
+"""
+
+import os
+import time
+import pickle
+import argparse
+import numpy as np
+import pandas as pd
+
+from preprocessing.extract_all_video_features import (
+    VIDEO_FOLDER, SAMPLING_POLICIES, extract_all_video_features
+)
+
+AUDIO_FEATURES_PATH = 'data/mini_dataset/mini_audio_features.pkl'
+TEXT_FEATURES_PATH = 'data/mini_dataset/mini_text_features.pkl'
+LABELS_PATH = 'data/mini_dataset/labels.csv'
+MODEL_DIR = 'models'
+
+
+def _load_fusion():
+    """Load the fusion model, scalers and encoder; return None if unavailable."""
+    try:
+        from tensorflow.keras.models import load_model  # type: ignore
+        model = load_model(os.path.join(MODEL_DIR, 'final_multimodal_logits_model.h5'))
+        scalers = {}
+        for name in ('audio', 'video', 'text'):
+            with open(os.path.join(MODEL_DIR, f'scaler_{name}.pkl'), 'rb') as f:
+                scalers[name] = pickle.load(f)
+        with open(os.path.join(MODEL_DIR, 'label_encoder.pkl'), 'rb') as f:
+            le = pickle.load(f)
+        return model, scalers, le
+    except Exception as e:
+        print(f"⚠️ Fusion model unavailable, skipping accuracy columns: {e}")
+        return None
+
+
+def _cosine(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-12))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--limit', type=int, default=50, help='number of clips to benchmark')
+    parser.add_argument('--policies', nargs='*', default=list(SAMPLING_POLICIES),
+                        help='policy names from SAMPLING_POLICIES')
+    args = parser.parse_args()
+
+    clip_ids = sorted(f[:-4] for f in os.listdir(VIDEO_FOLDER) if f.endswith('.mp4'))[:args.limit]
+    policies = ['all'] + [p for p in args.policies if p != 'all']
+
+    features = {name: {} for name in policies}
+    timings = {name: [] for name in policies}
+
+    for clip_id in clip_ids:
+        video_path = os.path.join(VIDEO_FOLDER, f'{clip_id}.mp4')
+        for name in policies:
+            start = time.perf_counter()
+            feat = extract_all_video_features(video_path, **SAMPLING_POLICIES[name])
+            timings[name].append(time.perf_counter() - start)
+            if feat is not None:
+                features[name][clip_id] = feat
+
+    fusion = _load_fusion()
+    if fusion is not None:
+        model, scalers, le = fusion
+        with open(AUDIO_FEATURES_PATH, 'rb') as f:
+            audio_features = pickle.load(f)
+        with open(TEXT_FEATURES_PATH, 'rb') as f:
+            text_features = pickle.load(f)
+        df = pd.read_csv(LABELS_PATH)
+        labels = dict(zip(df['video_id'] + '_' + df['clip_id'].astype(int).astype(str), df['annotation']))
+
+    def predict(name, clip_ids):
+        X_a = scalers['audio'].transform(np.stack([audio_features[c] for c in clip_ids]))
+        X_v = scalers['video'].transform(np.stack([features[name][c] for c in clip_ids]))
+        X_t = scalers['text'].transform(np.stack([text_features[c] for c in clip_ids]))
+        preds = model.predict([X_a, X_v, X_t], verbose=0)
+        return le.inverse_transform(np.argmax(preds, axis=1))
+
+    base_time = np.mean(timings['all'])
+    reference_preds = None
+    print(f"\n{'policy':<12} {'s/clip':>8} {'speedup':>8} {'cosine':>8} {'accuracy':>9} {'agree':>7}")
+    for name in policies:
+        common = [c for c in features['all'] if c in features[name]]
+        cosine = np.mean([_cosine(features[name][c], features['all'][c]) for c in common]) if common else float('nan')
+        accuracy = agreement = float('nan')
+        if fusion is not None:
+            scored = [c for c in common if c in audio_features and c in text_features and c in labels]
+            if scored:
+                preds = dict(zip(scored, predict(name, scored)))
+                if reference_preds is None:
+                    reference_preds = dict(zip(scored, predict('all', scored)))
+                accuracy = np.mean([preds[c] == labels[c] for c in scored])
+                agreement = np.mean([preds[c] == reference_preds[c] for c in scored if c in reference_preds])
+        mean_time = np.mean(timings[name])
+        print(f"{name:<12} {mean_time:>8.3f} {base_time / mean_time:>7.1f}x {cosine:>8.4f} "
+              f"{accuracy:>9.2%} {agreement:>7.2%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import shutil
+import subprocess
+import numpy as np
+
+# Every consumer (MFCC, transcription) works on 16 kHz mono
+SAMPLE_RATE = 16000
+
+def decode_audio(media_path, sample_rate=SAMPLE_RATE, start=None, duration=None):
+    """
+    Decode the audio track of any audio/video file once, straight to a mono
+    float32 buffer at sample_rate, through a single ffmpeg pipe (no temp WAV).
+    start / duration (seconds) decode only that part of the file.
+    Falls back to librosa when ffmpeg is unavailable or fails.
+    Returns None when the file has no decodable audio.
+    """
+    if shutil.which('ffmpeg'):
+        seek = ['-ss', f"{start:.3f}"] if start else []
+        span = ['-t', f"{duration:.3f}"] if duration is not None else []
+        cmd = ['ffmpeg', '-v', 'error', '-nostdin', *seek, '-i', media_path, *span, '-vn',
+               '-ac', '1', '-ar', str(sample_rate), '-f', 'f32le', '-']
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if proc.returncode == 0:
+            samples = np.frombuffer(proc.stdout, dtype=np.float32)
+            return samples if samples.size else None
+        print(f"ffmpeg could not decode {media_path}: {proc.stderr.decode(errors='ignore').strip()}")
+
+    try:
+        import librosa
+        samples, _ = librosa.load(media_path, sr=sample_rate, mono=True, offset=start or 0.0, duration=duration)
+        return samples.astype(np.float32) if samples.size else None
+    except Exception as e:
+        print(f"Error decoding audio from {media_path}: {e}")
+        return None
+
+def media_duration(media_path):
+    """Duration in seconds of an audio/video file (ffprobe, else OpenCV), or None if unknown."""
+    if shutil.which('ffprobe'):
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', media_path]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            return float(proc.stdout.decode().strip())
+        except ValueError:
+            pass
+    try:
+        import cv2
+        cap = cv2.VideoCapture(media_path)
+        fps, frames = cap.get(cv2.CAP_PROP_FPS), cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        cap.release()
+        return frames / fps if fps and frames else None
+    except ImportError:
+        return None
+
+def to_pcm16(samples):
+    """Float samples in [-1, 1] -> little-endian 16-bit PCM bytes."""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
@@ -12,14 +12,38 @@ OUTPUT_PATH = 'data/mini_dataset/mini_audio_features.pkl'
 SAMPLE_RATE = 16000
 N_MFCC = 13
 
+# Files at least this large are read block by block (preprocessing.streaming_mfcc)
+# instead of being decoded into memory whole
+STREAM_MIN_BYTES = int(float(os.environ.get('AUDIO_STREAM_MIN_MB', 64)) * 2**20)
+
+# Bump when the feature computation changes in a way the parameters do not capture
+EXTRACTOR_VERSION = 1
+
+def extractor_config():
+    """Everything that determines the features, recorded in the extraction manifest."""
+    return {'extractor': 'mfcc_mean', 'version': EXTRACTOR_VERSION,
+            'sample_rate': SAMPLE_RATE, 'n_mfcc': N_MFCC}
+
 def extract_mfcc_features(audio_path):
+    """
+    Mean MFCC vector of an audio file, or of an already decoded mono float
+    buffer at SAMPLE_RATE (e.g. from preprocessing.decode_audio). Files of
+    STREAM_MIN_BYTES or more are processed in constant memory.
+    """
+    if isinstance(audio_path, str) and os.path.isfile(audio_path) and os.path.getsize(audio_path) >= STREAM_MIN_BYTES:
+        from preprocessing.streaming_mfcc import stream_mfcc_features
+        return stream_mfcc_features(audio_path)
     try:
-        y, sr = librosa.load(audio_path, sr=SAMPLE_RATE)
+        if isinstance(audio_path, np.ndarray):
+            y, sr = audio_path, SAMPLE_RATE
+        else:
+            y, sr = librosa.load(audio_path, sr=SAMPLE_RATE)
         mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=N_MFCC)
         mfcc_mean = np.mean(mfcc.T, axis=0)  # Take average across time
         return mfcc_mean
     except Exception as e:
-        print(f"Error processing {audio_path}: {e}")
+        source = 'audio buffer' if isinstance(audio_path, np.ndarray) else audio_path
+        print(f"Error processing {source}: {e}")
         return None
 
 def main():
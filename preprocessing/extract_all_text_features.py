@@ -1,23 +1,81 @@
 import os
+import argparse
+import threading
 import torch
 import pickle
+import numpy as np
 from transformers import DistilBertTokenizer, DistilBertModel
 from tqdm import tqdm
 
+from preprocessing.memo import BoundedMemo, normalize_text
+from preprocessing.optimized_backends import check_backend, quantize_int8, OnnxEncoder
+
 # Paths
 TEXT_FOLDER = 'data/mini_dataset/segmented_transcripts'
 OUTPUT_PATH = 'data/mini_dataset/mini_text_features.pkl'
 
-# Load DistilBERT model and tokenizer
-tokenizer = DistilBertTokenizer.from_pretrained('distilbert-base-uncased')
-model = DistilBertModel.from_pretrained('distilbert-base-uncased')
-model.eval()
+EMBEDDING_DIM = 768
+
+# Bump when the feature computation changes in a way the parameters do not capture
+EXTRACTOR_VERSION = 1
+
+def extractor_config():
+    """Everything that determines the features, recorded in the extraction manifest."""
+    return {'extractor': 'distilbert-base-uncased_masked_mean', 'version': EXTRACTOR_VERSION,
+            'backend': TEXT_BACKEND, 'max_length': 512}
+
+# Texts per padded DistilBERT pass in offline (whole-dataset) extraction
+OFFLINE_BATCH_SIZE = int(os.environ.get('TEXT_OFFLINE_BATCH_SIZE', '64'))
+
+# TEXT_BACKEND: fp32 | int8 | onnx | onnx_int8 (see preprocessing/optimized_backends.py)
+TEXT_BACKEND = check_backend(os.environ.get('TEXT_BACKEND', 'fp32'))
+
+# Device configuration (quantized / ONNX backends run on CPU)
+device = torch.device('cuda' if torch.cuda.is_available() and TEXT_BACKEND == 'fp32' else 'cpu')
+
+# DistilBERT model and tokenizer, loaded on first use
+_tokenizer = None
+_model = None
+_model_lock = threading.Lock()
 
-# Device configuration
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-model.to(device)
+def load_text_model():
+    """Return (tokenizer, model), loading DistilBERT for TEXT_BACKEND on the first call."""
+    global _tokenizer, _model
+    with _model_lock:
+        if _model is None:
+            _tokenizer = DistilBertTokenizer.from_pretrained('distilbert-base-uncased')
+            if TEXT_BACKEND in ('onnx', 'onnx_int8'):
+                _model = OnnxEncoder(quantized=TEXT_BACKEND == 'onnx_int8')
+            else:
+                model = DistilBertModel.from_pretrained('distilbert-base-uncased')
+                model.eval()
+                if TEXT_BACKEND == 'int8':
+                    model = quantize_int8(model)
+                model.to(device)
+                _model = model
+    return _tokenizer, _model
+
+def warmup():
+    """Synthetic single and batched passes so the first real request is not the slow one."""
+    _embed_text("warm up the text encoder")
+    _embed_texts(["warm up", "the text encoder with a slightly longer sentence"])
+
+# Memoized embeddings, keyed on normalized text (the tokenizer is uncased)
+TEXT_MEMO_MAX_ENTRIES = int(os.environ.get('TEXT_MEMO_MAX_ENTRIES', '4096'))
+TEXT_MEMO_MAX_MB = float(os.environ.get('TEXT_MEMO_MAX_MB', '64'))
+TEXT_MEMO_TTL = float(os.environ.get('TEXT_MEMO_TTL', '3600')) or None
+embedding_memo = BoundedMemo(max_entries=TEXT_MEMO_MAX_ENTRIES,
+                             max_bytes=int(TEXT_MEMO_MAX_MB * 1024 * 1024),
+                             ttl=TEXT_MEMO_TTL)
+
+def extract_text_features(text, use_memo=True):
+    if use_memo:
+        return embedding_memo.lookup(normalize_text(text), lambda: _embed_text(text))
+    return _embed_text(text)
+
+def _embed_text(text):
+    tokenizer, model = load_text_model()
 
-def extract_text_features(text):
     # Tokenize the input text
     inputs = tokenizer(text, return_tensors='pt', truncation=True, padding=True, max_length=512).to(device)
 
@@ -28,21 +86,81 @@ def extract_text_features(text):
 
     return embeddings
 
-def main():
-    text_feature_dict = {}
+def _embed_texts(texts):
+    """Embed a list of texts in one padded DistilBERT pass, returns (N, 768)."""
+    tokenizer, model = load_text_model()
+    inputs = tokenizer(texts, return_tensors='pt', truncation=True, padding=True, max_length=512).to(device)
 
-    print("Extracting text features from all transcripts...\n")
+    with torch.no_grad():
+        outputs = model(**inputs)
+        embeddings = _masked_mean(outputs.last_hidden_state, inputs['attention_mask']).cpu().numpy()
+
+    return embeddings
+
+def _masked_mean(hidden, attention_mask):
+    """Mean pooling over real tokens only, so padding does not dilute shorter texts."""
+    mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+    summed = (hidden * mask).sum(dim=1)
+    return summed / mask.sum(dim=1).clamp(min=1)
+
+def embed_texts_bucketed(texts, batch_size=OFFLINE_BATCH_SIZE, progress=False):
+    """
+    Offline batched embedding of many texts, returns (N, 768) in input order.
+
+    Texts are tokenized once, sorted by token length and cut into batches of
+    batch_size, so each batch is padded only to its own longest text. With
+    mask-aware pooling every row equals the unbatched _embed_text result (up to
+    float rounding).
+    """
+    tokenizer, model = load_text_model()
+    encoded = tokenizer(list(texts), truncation=True, max_length=512)['input_ids']
+    order = sorted(range(len(encoded)), key=lambda i: len(encoded[i]))
+
+    embeddings = np.zeros((len(encoded), EMBEDDING_DIM), dtype=np.float32)
+    starts = range(0, len(order), batch_size)
+    for start in (tqdm(starts, unit='batch') if progress else starts):
+        bucket = order[start:start + batch_size]
+        inputs = tokenizer.pad({'input_ids': [encoded[i] for i in bucket]}, return_tensors='pt').to(device)
+        with torch.no_grad():
+            outputs = model(**inputs)
+            embeddings[bucket] = _masked_mean(outputs.last_hidden_state, inputs['attention_mask']).cpu().numpy()
+    return embeddings
+
+def extract_text_features_batch(texts, use_memo=True):
+    """
+    Batched extract_text_features: list of 768-d embeddings, one per text.
+    Memoized texts are served from the memo; the rest share one forward pass.
+    """
+    if not use_memo:
+        return list(_embed_texts(list(texts)))
+
+    keys = [normalize_text(t) for t in texts]
+    results = [embedding_memo.get(k) for k in keys]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        embeddings = _embed_texts([texts[i] for i in missing])
+        for i, emb in zip(missing, embeddings):
+            embedding_memo.put(keys[i], emb)
+            results[i] = emb
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract DistilBERT features for every segmented transcript.")
+    parser.add_argument('--batch-size', type=int, default=OFFLINE_BATCH_SIZE,
+                        help='transcripts per length-bucketed batch (1 embeds them one by one)')
+    args = parser.parse_args()
 
-    for filename in tqdm(os.listdir(TEXT_FOLDER)):
+    clip_ids, transcripts = [], []
+    for filename in sorted(os.listdir(TEXT_FOLDER)):
         if filename.endswith('.txt'):
-            clip_id = filename.replace('.txt', '')
-            text_path = os.path.join(TEXT_FOLDER, filename)
+            with open(os.path.join(TEXT_FOLDER, filename), 'r', encoding='utf-8') as f:
+                transcripts.append(f.read())
+            clip_ids.append(filename.replace('.txt', ''))
 
-            with open(text_path, 'r', encoding='utf-8') as f:
-                transcript = f.read()
+    print(f"Extracting text features from {len(transcripts)} transcripts (batch size {args.batch_size})...\n")
 
-            features = extract_text_features(transcript)
-            text_feature_dict[clip_id] = features
+    embeddings = embed_texts_bucketed(transcripts, batch_size=args.batch_size, progress=True)
+    text_feature_dict = dict(zip(clip_ids, embeddings))
 
     # Save all extracted features
     with open(OUTPUT_PATH, 'wb') as f:
@@ -0,0 +1,317 @@
+"""
+Unified, parallel, sharded and resumable feature extraction.
+
+Runs the audio (MFCC), video (ResNet18) and text (DistilBERT) extractors over
+the segmented mini dataset on a process pool. Clips are assigned to shards by
+a stable hash of their clip id, so `--shard i/N` on N machines splits the
+dataset without coordination, and newly added clips land in a predictable
+shard. Each shard checkpoints its features to
+<work-dir>/<modality>.shard-<i>-of-<N>.pkl every --checkpoint-every clips
+(atomically), and a re-run resumes from that checkpoint, skipping clips that
+are already done.
+
+Extraction is incremental: every checkpoint carries a manifest with the
+extractor configuration (version and parameters, e.g. N_MFCC, backbone,
+backend, sampling policy) and the sha256 of each clip's input file. A re-run
+only extracts new clips and clips whose content changed, drops clips whose
+input file was deleted, and re-extracts a whole modality when its extractor
+configuration changed (other modalities are untouched). `merge` combines the shard checkpoints into the usual
+mini_<modality>_features.pkl (and, with --store-dir, the memory-mapped
+feature store of preprocessing/feature_store.py).
+
+Usage:
+    python -m preprocessing.extract_features run audio video text --workers 4
+    python -m preprocessing.extract_features run video --shard 0/4 --workers 8   # on each of 4 nodes
+    python -m preprocessing.extract_features merge video --shards 4
+"""
+
+import os
+import glob
+import json
+import time
+import pickle
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+WORK_DIR = 'data/mini_dataset/extraction_shards'
+
+# modality -> (input folder, file extension, final output pickle)
+MODALITIES = {
+    'audio': ('data/mini_dataset/segmented_audio', '.wav', 'data/mini_dataset/mini_audio_features.pkl'),
+    'video': ('data/mini_dataset/segmented_video', '.mp4', 'data/mini_dataset/mini_video_features.pkl'),
+    'text': ('data/mini_dataset/segmented_transcripts', '.txt', 'data/mini_dataset/mini_text_features.pkl'),
+}
+
+
+def parse_shard(spec):
+    """'i/N' -> (i, N) with 0 <= i < N."""
+    try:
+        index, count = (int(x) for x in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {spec!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count}), got {index}")
+    return index, count
+
+
+def in_shard(clip_id, index, count):
+    """Stable assignment of a clip to one of `count` shards (independent of listing order)."""
+    return int(hashlib.sha1(clip_id.encode()).hexdigest()[:8], 16) % count == index
+
+
+def shard_path(work_dir, modality, index, count):
+    return os.path.join(work_dir, f"{modality}.shard-{index}-of-{count}.pkl")
+
+
+def list_clips(modality):
+    """Sorted {clip_id: path} of every input file for a modality."""
+    folder, ext, _ = MODALITIES[modality]
+    return {f[:-len(ext)]: os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(ext)}
+
+
+def load_checkpoint(path):
+    """{'config', 'manifest', 'features', 'failed'} of a shard (empty when it does not exist yet)."""
+    checkpoint = {'config': None, 'manifest': {}, 'features': {}, 'failed': []}
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            checkpoint.update(pickle.load(f))
+    return checkpoint
+
+
+def extractor_config(modality, video_policy='all'):
+    """The modality's extractor version and parameters, normalized to plain JSON types."""
+    if modality == 'audio':
+        from preprocessing.extract_all_audio_features import extractor_config as config
+        config = config()
+    elif modality == 'video':
+        from preprocessing.extract_all_video_features import extractor_config as config
+        config = config(video_policy)
+    else:
+        from preprocessing.extract_all_text_features import extractor_config as config
+        config = config()
+    return json.loads(json.dumps(config, sort_keys=True))
+
+
+def content_hash(path, previous=None):
+    """
+    Manifest entry {'sha256', 'size', 'mtime_ns'} for a file. The previous entry's
+    hash is reused when size and mtime are unchanged, so re-runs do not re-read
+    every input.
+    """
+    st = os.stat(path)
+    if previous and previous['size'] == st.st_size and previous['mtime_ns'] == st.st_mtime_ns:
+        return previous
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return {'sha256': h.hexdigest(), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def save_pickle(obj, path):
+    """Write a pickle atomically, so a crash mid-write never corrupts the previous checkpoint."""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+# ─── Workers ─────────────────────────────────────────────────────────────────
+
+def _init_worker(threads):
+    """Split the cores between worker processes instead of letting every torch / BLAS pool claim all of them."""
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def extract_chunk(modality, items, video_policy='all'):
+    """
+    Extract features for a list of (clip_id, path) pairs in the calling process.
+    Returns {clip_id: feature or None}.
+    """
+    if modality == 'audio':
+        from preprocessing.extract_all_audio_features import extract_mfcc_features
+        return {clip_id: extract_mfcc_features(path) for clip_id, path in items}
+
+    if modality == 'video':
+        from preprocessing.extract_all_video_features import extract_all_video_features, SAMPLING_POLICIES
+        return {clip_id: extract_all_video_features(path, **SAMPLING_POLICIES[video_policy])
+                for clip_id, path in items}
+
+    from preprocessing.extract_all_text_features import embed_texts_bucketed
+    texts = []
+    for _, path in items:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    return dict(zip((clip_id for clip_id, _ in items), embed_texts_bucketed(texts)))
+
+
+# ─── Run / merge ─────────────────────────────────────────────────────────────
+
+def run(modality, shard=(0, 1), workers=1, chunk_size=8, checkpoint_every=50,
+        work_dir=WORK_DIR, video_policy='all', retry_failed=False):
+    """
+    Extract one modality's shard, resuming from its checkpoint and only
+    (re-)extracting clips that are new, changed, or whose extractor
+    configuration changed. Returns the checkpoint path.
+    """
+    index, count = shard
+    os.makedirs(work_dir, exist_ok=True)
+    path = shard_path(work_dir, modality, index, count)
+    config = extractor_config(modality, video_policy)
+    checkpoint = load_checkpoint(path)
+
+    old_manifest = checkpoint['manifest']
+    if checkpoint['config'] != config and (checkpoint['features'] or checkpoint['failed']):
+        print(f"⚠️ {modality} extractor configuration changed, re-extracting shard {index}/{count}")
+        checkpoint = load_checkpoint(None)
+    features, failed = checkpoint['features'], set(checkpoint['failed'])
+
+    clips = {c: p for c, p in list_clips(modality).items() if in_shard(c, index, count)}
+    manifest = {c: content_hash(p, old_manifest.get(c)) for c, p in clips.items()}
+
+    deleted = (set(features) | failed | set(old_manifest)) - set(clips)
+    changed = {c for c in clips if c in old_manifest and old_manifest[c]['sha256'] != manifest[c]['sha256']}
+    for clip_id in deleted | changed:
+        features.pop(clip_id, None)
+        failed.discard(clip_id)
+    if retry_failed:
+        failed.clear()
+
+    def save():
+        save_pickle({'config': config, 'manifest': manifest, 'features': features, 'failed': sorted(failed)}, path)
+
+    todo = [(c, p) for c, p in clips.items() if c not in features and c not in failed]
+    print(f"▶ {modality} shard {index}/{count}: {len(features)} up to date, {len(todo)} to extract "
+          f"({len(changed)} changed, {len(deleted)} deleted)")
+    if not todo:
+        if deleted or changed or checkpoint['config'] != config or old_manifest != manifest:
+            save()
+        return path
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    since_checkpoint = 0
+    start = time.perf_counter()
+
+    def collect(results):
+        nonlocal since_checkpoint
+        for clip_id, feat in results.items():
+            if feat is None:
+                failed.add(clip_id)
+            else:
+                features[clip_id] = feat
+        since_checkpoint += len(results)
+        if since_checkpoint >= checkpoint_every:
+            save()
+            since_checkpoint = 0
+
+    with tqdm(total=len(todo), unit='clip') as bar:
+        if workers <= 1:
+            for chunk in chunks:
+                collect(extract_chunk(modality, chunk, video_policy))
+                bar.update(len(chunk))
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+                futures = {pool.submit(extract_chunk, modality, chunk, video_policy): chunk for chunk in chunks}
+                for future in as_completed(futures):
+                    collect(future.result())
+                    bar.update(len(futures[future]))
+
+    save()
+    print(f"✅ {modality} shard {index}/{count}: {len(features)} clips, {len(failed)} failed "
+          f"({time.perf_counter() - start:.1f}s) -> {path}")
+    return path
+
+
+def merge(modality, count=None, work_dir=WORK_DIR, output_path=None, store_dir=None, store_dtype='float32'):
+    """
+    Combine the shard checkpoints of one modality into its final feature pickle
+    and <work_dir>/<modality>.manifest.json, and into the memory-mapped feature
+    store as well when store_dir is given.
+    """
+    if count is None:
+        paths = sorted(glob.glob(os.path.join(work_dir, f"{modality}.shard-*-of-*.pkl")))
+        counts = {p.rsplit('-of-', 1)[1][:-len('.pkl')] for p in paths}
+        if len(counts) != 1:
+            raise SystemExit(f"{modality}: found shard sets {sorted(counts)} in {work_dir}; pass --shards N")
+        count = int(counts.pop())
+
+    feature_dict, manifest, failed, configs, missing = {}, {}, [], [], []
+    for index in range(count):
+        path = shard_path(work_dir, modality, index, count)
+        if not os.path.exists(path):
+            missing.append(index)
+            continue
+        checkpoint = load_checkpoint(path)
+        feature_dict.update(checkpoint['features'])
+        manifest.update(checkpoint['manifest'])
+        failed.extend(checkpoint['failed'])
+        configs.append(checkpoint['config'])
+    if missing:
+        raise SystemExit(f"{modality}: shards {missing} of {count} have not been extracted yet")
+    if any(c != configs[0] for c in configs):
+        raise SystemExit(f"{modality}: shards were extracted with different extractor configurations; re-run them")
+
+    manifest_path = os.path.join(work_dir, f"{modality}.manifest.json")
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump({'config': configs[0], 'failed': sorted(failed),
+                   'clips': {c: manifest[c]['sha256'] for c in sorted(manifest)}}, f, indent=1)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    output_path = output_path or MODALITIES[modality][2]
+    save_pickle(dict(sorted(feature_dict.items())), output_path)
+    print(f"✅ Merged {len(feature_dict)} {modality} features from {count} shard(s) ({len(failed)} failed clips)")
+    print(f"🔸 Saved to: {output_path}")
+    if store_dir:
+        from preprocessing.feature_store import write_modality
+        print(f"🔸 Feature store: {write_modality(store_dir, modality, feature_dict, store_dtype)}")
+    return output_path
+
+
+def main():
+    from preprocessing.extract_all_video_features import SAMPLING_POLICIES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='extract features for one shard (merges automatically with 1 shard)')
+    run_parser.add_argument('modalities', nargs='+', choices=list(MODALITIES))
+    run_parser.add_argument('--shard', type=parse_shard, default=(0, 1), help='i/N: this node extracts shard i of N')
+    run_parser.add_argument('--workers', type=int, default=1, help='extraction processes')
+    run_parser.add_argument('--chunk-size', type=int, default=8, help='clips per task sent to a worker')
+    run_parser.add_argument('--checkpoint-every', type=int, default=50, help='clips between checkpoints')
+    run_parser.add_argument('--work-dir', default=WORK_DIR)
+    run_parser.add_argument('--video-policy', default='all', choices=sorted(SAMPLING_POLICIES),
+                            help='frame sampling policy (SAMPLING_POLICIES)')
+    run_parser.add_argument('--retry-failed', action='store_true', help='re-extract clips that failed before')
+
+    merge_parser = sub.add_parser('merge', help='combine shard checkpoints into the final feature pickles')
+    merge_parser.add_argument('modalities', nargs='+', choices=list(MODALITIES))
+    merge_parser.add_argument('--shards', type=int, default=None, help='N (default: inferred from the work dir)')
+    merge_parser.add_argument('--work-dir', default=WORK_DIR)
+    for p in (run_parser, merge_parser):
+        p.add_argument('--store-dir', default=None,
+                       help='also write the merged features to this memory-mapped feature store')
+        p.add_argument('--store-dtype', default='float32', choices=['float32', 'float16'])
+
+    args = parser.parse_args()
+
+    for modality in args.modalities:
+        if args.command == 'run':
+            run(modality, args.shard, args.workers, args.chunk_size, args.checkpoint_every,
+                args.work_dir, args.video_policy, args.retry_failed)
+            if args.shard[1] == 1:
+                merge(modality, 1, args.work_dir, store_dir=args.store_dir, store_dtype=args.store_dtype)
+        else:
+            merge(modality, args.shards, args.work_dir, store_dir=args.store_dir, store_dtype=args.store_dtype)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Memory-mapped columnar feature store.
+
+The pickled {clip_id: ndarray} dicts have to be unpickled completely before
+training can start. The store keeps, per modality:
+
+    <store_dir>/<modality>.npy        contiguous (n_clips, dim) float32 or float16 matrix
+    <store_dir>/<modality>.ids.json   clip id of every row, in row order
+
+The matrices are opened with np.load(mmap_mode='r'): opening is instant
+whatever the size, only the rows that are read are paged in, and processes
+reading the same store share the OS page cache. `ModalityFeatures` also
+behaves like the old read-only dict (`clip_id in f`, `f[clip_id]`, `f.keys()`),
+so existing code keeps working.
+
+Usage:
+    python -m preprocessing.feature_store convert                  # pickles -> store (float32)
+    python -m preprocessing.feature_store convert --dtype float16
+    python -m preprocessing.feature_store info
+"""
+
+import os
+import json
+import pickle
+import argparse
+import numpy as np
+
+STORE_DIR = 'data/mini_dataset/feature_store'
+PICKLE_PATHS = {
+    'audio': 'data/mini_dataset/mini_audio_features.pkl',
+    'video': 'data/mini_dataset/mini_video_features.pkl',
+    'text': 'data/mini_dataset/mini_text_features.pkl',
+}
+DTYPES = ('float32', 'float16')
+
+
+def _paths(store_dir, modality):
+    return os.path.join(store_dir, f"{modality}.npy"), os.path.join(store_dir, f"{modality}.ids.json")
+
+
+def write_modality(store_dir, modality, features, dtype='float32'):
+    """
+    Write one modality from a {clip_id: 1-D array} mapping, rows sorted by clip id.
+    Rows are copied straight into the memory-mapped output, so no second full
+    copy of the features is held in RAM. Both files are replaced atomically.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+    clip_ids = sorted(features)
+    if not clip_ids:
+        raise ValueError(f"No {modality} features to write")
+
+    os.makedirs(store_dir, exist_ok=True)
+    matrix_path, ids_path = _paths(store_dir, modality)
+    dim = np.asarray(features[clip_ids[0]]).reshape(-1).shape[0]
+
+    tmp_matrix = f"{matrix_path}.tmp.npy"
+    out = np.lib.format.open_memmap(tmp_matrix, mode='w+', dtype=dtype, shape=(len(clip_ids), dim))
+    for row, clip_id in enumerate(clip_ids):
+        out[row] = np.asarray(features[clip_id]).reshape(-1)
+    out.flush()
+    del out
+
+    tmp_ids = f"{ids_path}.tmp"
+    with open(tmp_ids, 'w') as f:
+        json.dump(clip_ids, f)
+    os.replace(tmp_matrix, matrix_path)
+    os.replace(tmp_ids, ids_path)
+    return matrix_path
+
+
+class ModalityFeatures:
+    """Read-only view of one modality: a memory-mapped matrix plus its clip-id index."""
+
+    def __init__(self, store_dir, modality):
+        matrix_path, ids_path = _paths(store_dir, modality)
+        self.modality = modality
+        self.matrix = np.load(matrix_path, mmap_mode='r')
+        with open(ids_path) as f:
+            self.clip_ids = json.load(f)
+        self.index = {clip_id: row for row, clip_id in enumerate(self.clip_ids)}
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def rows(self, clip_ids, dtype=np.float32):
+        """(len(clip_ids), dim) array for the given clips; only their pages are read."""
+        return np.asarray(self.matrix[[self.index[c] for c in clip_ids]], dtype=dtype)
+
+    def __getitem__(self, clip_id):
+        return np.asarray(self.matrix[self.index[clip_id]], dtype=np.float32)
+
+    def get(self, clip_id, default=None):
+        return self[clip_id] if clip_id in self.index else default
+
+    def __contains__(self, clip_id):
+        return clip_id in self.index
+
+    def __len__(self):
+        return len(self.clip_ids)
+
+    def __iter__(self):
+        return iter(self.clip_ids)
+
+    def keys(self):
+        return self.index.keys()
+
+
+class FeatureStore:
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self._open = {}
+
+    @property
+    def modalities(self):
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(f[:-len('.ids.json')] for f in os.listdir(self.store_dir) if f.endswith('.ids.json'))
+
+    def __contains__(self, modality):
+        return all(os.path.exists(p) for p in _paths(self.store_dir, modality))
+
+    def open(self, modality) -> ModalityFeatures:
+        if modality not in self._open:
+            self._open[modality] = ModalityFeatures(self.store_dir, modality)
+        return self._open[modality]
+
+    def write(self, modality, features, dtype='float32'):
+        self._open.pop(modality, None)
+        return write_modality(self.store_dir, modality, features, dtype)
+
+
+def load_features(modality, store_dir=STORE_DIR, pickle_path=None):
+    """
+    Features of one modality, from the store when it has been built, otherwise
+    unpickled from the legacy dict. Either way the result supports `in`, [] and keys().
+    """
+    store = FeatureStore(store_dir)
+    if modality in store:
+        return store.open(modality)
+    with open(pickle_path or PICKLE_PATHS[modality], 'rb') as f:
+        return pickle.load(f)
+
+
+def convert(modalities=tuple(PICKLE_PATHS), store_dir=STORE_DIR, dtype='float32'):
+    """Convert the legacy feature pickles into the store."""
+    store = FeatureStore(store_dir)
+    for modality in modalities:
+        with open(PICKLE_PATHS[modality], 'rb') as f:
+            features = pickle.load(f)
+        path = store.write(modality, features, dtype)
+        view = store.open(modality)
+        print(f"💾 {modality}: {len(view)} clips x {view.dim} {dtype} -> {path}")
+    print(f"✅ Feature store written to {store_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['convert', 'info'])
+    parser.add_argument('--modalities', nargs='*', default=list(PICKLE_PATHS), choices=list(PICKLE_PATHS))
+    parser.add_argument('--store-dir', default=STORE_DIR)
+    parser.add_argument('--dtype', default='float32', choices=DTYPES)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert(args.modalities, args.store_dir, args.dtype)
+    else:
+        store = FeatureStore(args.store_dir)
+        for modality in store.modalities:
+            view = store.open(modality)
+            size = os.path.getsize(_paths(args.store_dir, modality)[0]) / 2**20
+            print(f"{modality:<6} {len(view):>7} clips  dim={view.dim:<5} {view.matrix.dtype}  {size:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""
+CPU-optimized backends for the feature extractors and the RoBERTa classifier.
+
+Each network (DistilBERT, ResNet18, RoBERTa) can be served as:
+- "fp32":      the original eager PyTorch model (default)
+- "int8":      torch dynamic quantization of the nn.Linear layers (no export
+               step; not available for ResNet18, which has no Linear layers
+               once its classifier is removed)
+- "onnx":      ONNX Runtime on an FP32 export
+- "onnx_int8": ONNX Runtime on a dynamically quantized (int8 weight) export
+
+The backend is chosen per engine at startup with TEXT_BACKEND (DistilBERT),
+VIDEO_BACKEND (ResNet18) and HF_BACKEND (RoBERTa). The ONNX wrappers mimic the
+call signature of the objects they replace, so the extraction code is the same
+for every backend. Quantized models run on CPU only.
+
+Usage:
+    python -m preprocessing.optimized_backends export                 # all three
+    python -m preprocessing.optimized_backends export --models resnet18
+    python -m preprocessing.benchmark_backends                        # parity harness
+"""
+
+import os
+import argparse
+import numpy as np
+
+BACKENDS = ('fp32', 'int8', 'onnx', 'onnx_int8')
+# Anchored to the project root: the server runs from api/, the export from the root
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ONNX_DIR = os.path.join(PROJECT_ROOT, 'models', 'onnx')
+ONNX_OPSET = 14
+
+ROBERTA_MODEL_NAME = 'cardiffnlp/twitter-roberta-base-sentiment-latest'
+
+
+def check_backend(backend, allowed=BACKENDS):
+    if backend not in allowed:
+        raise ValueError(f"Unknown backend {backend!r}; choose one of {', '.join(allowed)}")
+    return backend
+
+
+def onnx_path(name, quantized=False):
+    return os.path.join(ONNX_DIR, f"{name}.int8.onnx" if quantized else f"{name}.onnx")
+
+
+# ─── Loading ─────────────────────────────────────────────────────────────────
+
+def quantize_int8(model):
+    """Torch dynamic int8 quantization of every nn.Linear (weights int8, activations quantized per batch)."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_session(name, quantized=False):
+    """ONNX Runtime CPU session for an exported model."""
+    import onnxruntime as ort
+
+    path = onnx_path(name, quantized)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run `python -m preprocessing.optimized_backends export`")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    threads = int(os.environ.get('ORT_INTRA_OP_THREADS', '0'))
+    if threads:
+        options.intra_op_num_threads = threads
+    return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class OnnxResNet:
+    """ONNX Runtime stand-in for the headless ResNet18: (N, 3, 224, 224) tensor -> (N, 512, 1, 1) tensor."""
+
+    def __init__(self, quantized=False):
+        self.session = onnx_session('resnet18', quantized)
+
+    def __call__(self, pixels):
+        import torch
+        (features,) = self.session.run(None, {'pixels': pixels.cpu().numpy().astype(np.float32, copy=False)})
+        return torch.from_numpy(features)
+
+
+class OnnxEncoder:
+    """ONNX Runtime stand-in for DistilBertModel: model(**inputs).last_hidden_state."""
+
+    class Output:
+        def __init__(self, last_hidden_state):
+            self.last_hidden_state = last_hidden_state
+
+    def __init__(self, quantized=False):
+        self.session = onnx_session('distilbert', quantized)
+
+    def __call__(self, input_ids, attention_mask, **_):
+        import torch
+        (hidden,) = self.session.run(None, {
+            'input_ids': input_ids.cpu().numpy().astype(np.int64, copy=False),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64, copy=False),
+        })
+        return self.Output(torch.from_numpy(hidden))
+
+
+class OnnxTextClassifier:
+    """
+    ONNX Runtime stand-in for a transformers text-classification pipeline with
+    top_k=None: a list of strings gives one list of {label, score} (highest
+    first) per string, and a single string gives that same nesting for one
+    text, [[{label, score}, ...]], as the pipeline does.
+    """
+
+    def __init__(self, model_name=ROBERTA_MODEL_NAME, quantized=False, max_length=512):
+        from transformers import AutoTokenizer, AutoConfig
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.id2label = AutoConfig.from_pretrained(model_name).id2label
+        self.session = onnx_session('roberta', quantized)
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.max_length = max_length
+
+    def __call__(self, texts, batch_size=None):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        batch_size = batch_size or len(texts) or 1
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='np')
+            (logits,) = self.session.run(None, {name: enc[name].astype(np.int64) for name in self.input_names})
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probs = exp / exp.sum(axis=1, keepdims=True)
+            for row in probs:
+                order = np.argsort(-row)
+                results.append([{"label": self.id2label[int(i)], "score": float(row[i])} for i in order])
+        return results
+
+
+def load_text_classifier(model_name=ROBERTA_MODEL_NAME, backend='fp32'):
+    """RoBERTa sentiment classifier (pipeline-compatible callable) for the given backend."""
+    check_backend(backend)
+    if backend in ('onnx', 'onnx_int8'):
+        return OnnxTextClassifier(model_name, quantized=backend == 'onnx_int8')
+
+    from transformers import pipeline
+    classifier = pipeline(
+        "text-classification",
+        model=model_name,
+        top_k=None,          # return all scores
+        truncation=True,
+        max_length=512,
+        device=-1 if backend == 'int8' else None,
+    )
+    if backend == 'int8':
+        classifier.model = quantize_int8(classifier.model)
+    return classifier
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+def quantize_onnx(name):
+    """Write the int8 dynamically quantized copy of an FP32 export."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(onnx_path(name), onnx_path(name, quantized=True), weight_type=QuantType.QInt8)
+    print(f"💾 {onnx_path(name, quantized=True)}")
+
+
+def _export(name, module, args, input_names, output_names, dynamic_axes):
+    import torch
+
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    module.eval()
+    with torch.no_grad():
+        torch.onnx.export(module, args, onnx_path(name), input_names=input_names, output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET, do_constant_folding=True)
+    print(f"💾 {onnx_path(name)}")
+    quantize_onnx(name)
+
+
+def export_resnet18():
+    import torch
+    from preprocessing.extract_all_video_features import build_resnet, IMAGE_SIZE
+
+    _export('resnet18', build_resnet().cpu(), (torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE),),
+            ['pixels'], ['features'], {'pixels': {0: 'batch'}, 'features': {0: 'batch'}})
+
+
+def _export_transformer(name, model, tokenizer, output):
+    """Export a Hugging Face encoder returning `output` (last_hidden_state or logits) from ids + mask."""
+    import torch
+
+    class Wrapper(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return getattr(self.model(input_ids=input_ids, attention_mask=attention_mask), output)
+
+    enc = tokenizer(["export the encoder", "with a second, longer example sentence"],
+                    padding=True, return_tensors='pt')
+    axes = {0: 'batch', 1: 'sequence'}
+    _export(name, Wrapper().cpu(), (enc['input_ids'], enc['attention_mask']),
+            ['input_ids', 'attention_mask'], [output],
+            {'input_ids': axes, 'attention_mask': axes, output: axes if output == 'last_hidden_state' else {0: 'batch'}})
+
+
+def export_distilbert():
+    from transformers import DistilBertTokenizer, DistilBertModel
+
+    tokenizer = DistilBertTokenizer.from_pretrained('distilbert-base-uncased')
+    _export_transformer('distilbert', DistilBertModel.from_pretrained('distilbert-base-uncased'),
+                        tokenizer, 'last_hidden_state')
+
+
+def export_roberta(model_name=ROBERTA_MODEL_NAME):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    _export_transformer('roberta', AutoModelForSequenceClassification.from_pretrained(model_name),
+                        AutoTokenizer.from_pretrained(model_name), 'logits')
+
+
+EXPORTERS = {
+    'distilbert': export_distilbert,
+    'resnet18': export_resnet18,
+    'roberta': export_roberta,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--models', nargs='*', default=list(EXPORTERS), choices=list(EXPORTERS))
+    args = parser.parse_args()
+
+    for name in args.models:
+        print(f"⏳ Exporting {name} ...")
+        EXPORTERS[name]()
+    print(f"✅ ONNX exports written to {ONNX_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from preprocessing.decode_audio import SAMPLE_RATE
+
+# Frame length (seconds) of the energy envelope used to find pauses
+SILENCE_FRAME = 0.025
+
+def fixed_windows(duration, window=10.0, hop=None):
+    """
+    (start, end) windows of `window` seconds every `hop` seconds (default: no
+    overlap) covering [0, duration]. The last window is cut at the end of the media.
+    """
+    duration, hop = float(duration), hop or window
+    windows = []
+    start = 0.0
+    while start < duration:
+        windows.append((round(start, 3), round(min(start + window, duration), 3)))
+        if start + window >= duration:
+            break
+        start += hop
+    return windows
+
+def silence_windows(samples, sample_rate=SAMPLE_RATE, min_window=4.0, max_window=15.0, top_db=35.0):
+    """
+    Split an audio buffer at pauses: windows end in the middle of a silent run
+    (frames more than top_db below the loudest frame) once they are at least
+    min_window seconds long, and are force-split at max_window when nobody
+    pauses. A tail shorter than min_window / 2 is merged into the last window.
+    Returns (start, end) pairs in seconds.
+    """
+    duration = len(samples) / sample_rate
+    hop = int(sample_rate * SILENCE_FRAME)
+    n_frames = len(samples) // hop
+    if n_frames == 0:
+        return [(0.0, round(duration, 3))] if duration else []
+
+    frames = np.asarray(samples[:n_frames * hop], dtype=np.float32).reshape(n_frames, hop)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    db = 20 * np.log10(np.maximum(rms, 1e-10) / max(float(rms.max()), 1e-10))
+    silent = db < -top_db
+
+    # Centre of every silent run, in seconds
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    run_starts, run_ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    cuts = ((run_starts + run_ends) / 2 * SILENCE_FRAME).tolist()
+
+    windows = []
+    start = 0.0
+    for cut in cuts + [duration]:
+        while cut - start > max_window:
+            windows.append((start, start + max_window))
+            start += max_window
+        if cut - start >= min_window:
+            windows.append((start, cut))
+            start = cut
+    if duration - start > 0:
+        if windows and duration - start < min_window / 2:
+            windows[-1] = (windows[-1][0], duration)
+        else:
+            windows.append((start, duration))
+    return [(round(s, 3), round(e, 3)) for s, e in windows]
@@ -0,0 +1,245 @@
+import numpy as np
+
+from preprocessing.decode_audio import SAMPLE_RATE
+from preprocessing.extract_all_audio_features import N_MFCC
+
+# librosa.feature.mfcc defaults used by extract_mfcc_features
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+
+# Per-band histogram of log-mel values below 0 dB, used to apply librosa's
+# top_db floor (relative to the loudest value of the whole signal) at the end
+HIST_MIN_DB = -100.0          # 10 * log10(AMIN)
+HIST_BIN_DB = 1.0
+HIST_BINS = int(-HIST_MIN_DB / HIST_BIN_DB)
+
+_mel_basis = None
+_window = None
+
+def _filters():
+    """Slaney mel filterbank and periodic Hann window, built once and shared by every stream."""
+    global _mel_basis, _window
+    if _mel_basis is None:
+        import librosa
+        _mel_basis = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32)
+        _window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+    return _mel_basis, _window
+
+def _dct(x):
+    import scipy.fftpack
+    return scipy.fftpack.dct(x, axis=0, type=2, norm='ortho')
+
+class StreamingMFCC:
+    """
+    Incremental equivalent of extract_mfcc_features: feed mono float audio in
+    chunks of any size, read the running mean MFCC vector at any time.
+
+    Frames are cut exactly like librosa (n_fft=2048, hop=512, centred with zero
+    padding) and only the last n_fft samples are buffered, so memory and the
+    cost of `update` depend on the chunk size, never on how much audio has
+    been seen. The mean is taken over log-mel frames (the DCT is linear, so this
+    equals the mean of the MFCC frames); librosa's top_db floor, which depends
+    on the loudest frame of the whole signal, is applied when the mean is read,
+    through a per-band histogram of the quiet values (1 dB bins).
+
+    input_rate other than 16 kHz is resampled on the fly with soxr.
+    track_variance additionally keeps per-coefficient MFCC variance, with the
+    floor taken from the loudest frame seen so far at the time of each frame.
+
+    When the floor is known in advance (floor_db, e.g. from a first pass over a
+    file, see stream_mfcc_features), it is applied to every frame as it
+    arrives and the mean and variance are exact instead.
+    """
+
+    def __init__(self, input_rate=SAMPLE_RATE, n_mfcc=N_MFCC, track_variance=False, floor_db=None):
+        self.mel_basis, self.window = _filters()
+        self.n_mfcc = n_mfcc
+        self.track_variance = track_variance
+        self.floor_db = floor_db
+        self.resampler = None
+        if input_rate != SAMPLE_RATE:
+            import soxr
+            self.resampler = soxr.ResampleStream(input_rate, SAMPLE_RATE, 1, dtype='float32')
+
+        self._buffer = np.zeros(N_FFT // 2, dtype=np.float32)   # centre padding
+        self.n_samples = 0
+        self.n_frames = 0
+        self.finished = False
+
+        self._db_sum = np.zeros(N_MELS, dtype=np.float64)
+        self._max_db = -np.inf
+        self._hist_count = np.zeros(N_MELS * HIST_BINS, dtype=np.int64)
+        self._hist_sum = np.zeros(N_MELS * HIST_BINS, dtype=np.float64)
+        if track_variance:
+            self._mfcc_sum = np.zeros(n_mfcc, dtype=np.float64)
+            self._mfcc_sq_sum = np.zeros(n_mfcc, dtype=np.float64)
+
+    @property
+    def seconds(self):
+        return self.n_samples / SAMPLE_RATE
+
+    def update(self, samples):
+        """Add a chunk of mono samples (input_rate); returns the number of new frames."""
+        if self.finished:
+            raise RuntimeError("StreamingMFCC already finalized")
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self.resampler is not None:
+            samples = self.resampler.resample_chunk(samples)
+        self.n_samples += len(samples)
+        return self._consume(samples)
+
+    def finalize(self):
+        """Flush the resampler and the trailing centre padding (call once, at end of stream)."""
+        if self.finished:
+            return 0
+        tail = np.zeros(0, dtype=np.float32)
+        if self.resampler is not None:
+            tail = self.resampler.resample_chunk(tail, last=True)
+            self.n_samples += len(tail)
+        # librosa yields 1 + n_samples // hop frames in total
+        target = 1 + self.n_samples // HOP_LENGTH
+        new = self._consume(np.concatenate([tail, np.zeros(N_FFT // 2, dtype=np.float32)]), limit=target)
+        self.finished = True
+        return new
+
+    def _consume(self, samples, limit=None):
+        buffer = np.concatenate([self._buffer, samples]) if len(samples) else self._buffer
+        n_new = 0 if len(buffer) < N_FFT else 1 + (len(buffer) - N_FFT) // HOP_LENGTH
+        if limit is not None:
+            n_new = max(0, min(n_new, limit - self.n_frames))
+        if n_new:
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, N_FFT)[::HOP_LENGTH][:n_new]
+            self._accumulate(frames)
+        self._buffer = buffer[n_new * HOP_LENGTH:]
+        return n_new
+
+    def _accumulate(self, frames):
+        spectrum = np.fft.rfft(frames * self.window, n=N_FFT, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mel = self.mel_basis @ power.T.astype(np.float32)                      # (n_mels, n_frames)
+        db = 10.0 * np.log10(np.maximum(AMIN, mel)).astype(np.float64)
+        self._max_db = max(self._max_db, float(db.max()))
+        if self.floor_db is not None:
+            db = np.maximum(db, self.floor_db)
+
+        self.n_frames += db.shape[1]
+        self._db_sum += db.sum(axis=1)
+
+        quiet = db < 0 if self.floor_db is None else None
+        if quiet is not None and quiet.any():
+            bands = np.broadcast_to(np.arange(N_MELS)[:, None], db.shape)[quiet]
+            bins = np.clip(((db[quiet] - HIST_MIN_DB) / HIST_BIN_DB).astype(np.int64), 0, HIST_BINS - 1)
+            flat = bands * HIST_BINS + bins
+            size = N_MELS * HIST_BINS
+            self._hist_count += np.bincount(flat, minlength=size)
+            self._hist_sum += np.bincount(flat, weights=db[quiet], minlength=size)
+
+        if self.track_variance:
+            floor = self._max_db - TOP_DB if self.floor_db is None else self.floor_db
+            mfcc = _dct(np.maximum(db, floor))[:self.n_mfcc]
+            self._mfcc_sum += mfcc.sum(axis=1)
+            self._mfcc_sq_sum += (mfcc ** 2).sum(axis=1)
+
+    def _mean_db(self):
+        """Per-band mean of the log-mel frames after librosa's top_db floor."""
+        if self.floor_db is not None:
+            return self._db_sum / self.n_frames
+        floor = self._max_db - TOP_DB
+        total = self._db_sum.copy()
+        if floor > HIST_MIN_DB:
+            counts = self._hist_count.reshape(N_MELS, HIST_BINS)
+            sums = self._hist_sum.reshape(N_MELS, HIST_BINS)
+            # A bin counts as below the floor when its mean value is
+            below = (sums < floor * counts) & (counts > 0)
+            total += np.where(below, floor * counts - sums, 0.0).sum(axis=1)
+        return total / self.n_frames
+
+    def mean(self):
+        """Mean MFCC vector (n_mfcc,) of everything seen so far, or None before the first frame."""
+        if not self.n_frames:
+            return None
+        return _dct(self._mean_db())[:self.n_mfcc].astype(np.float32)
+
+    def variance(self):
+        """Per-coefficient MFCC variance (requires track_variance=True)."""
+        if not self.track_variance:
+            raise RuntimeError("StreamingMFCC was created without track_variance")
+        if not self.n_frames:
+            return None
+        mean = self._mfcc_sum / self.n_frames
+        return np.maximum(self._mfcc_sq_sum / self.n_frames - mean ** 2, 0.0).astype(np.float32)
+
+# Audio read per block by stream_mfcc_features
+STREAM_BLOCK_SECONDS = 10.0
+
+def _open_blocks(audio_path, block_seconds):
+    """
+    (sample_rate, iterator of mono float32 blocks) for a file. soundfile reads
+    the formats librosa.load reads through it, at the native rate (resampled by
+    StreamingMFCC with soxr, like librosa); anything else (mp3, video
+    containers) is piped through ffmpeg at 16 kHz.
+    """
+    try:
+        import soundfile as sf
+        f = sf.SoundFile(audio_path)
+    except Exception:
+        f = None
+
+    if f is not None:
+        def blocks():
+            with f:
+                n = max(1, int(block_seconds * f.samplerate))
+                while True:
+                    block = f.read(n, dtype='float32', always_2d=True)
+                    if not len(block):
+                        return
+                    yield block.mean(axis=1)
+        return f.samplerate, blocks()
+
+    import subprocess
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin', '-i', audio_path, '-vn',
+           '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-']
+
+    def blocks():
+        block_bytes = int(block_seconds * SAMPLE_RATE) * 4
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while raw := proc.stdout.read(block_bytes):
+                yield np.frombuffer(raw[:len(raw) - len(raw) % 4], dtype=np.float32)
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+    return SAMPLE_RATE, blocks()
+
+def _stream_file(audio_path, block_seconds, **kwargs):
+    """A finalized StreamingMFCC fed with the whole file, block_seconds at a time."""
+    sample_rate, blocks = _open_blocks(audio_path, block_seconds)
+    stream = StreamingMFCC(input_rate=sample_rate, **kwargs)
+    for block in blocks:
+        stream.update(block)
+    stream.finalize()
+    if not stream.n_frames:
+        raise ValueError("no audio samples")
+    return stream
+
+def stream_mfcc_features(audio_path, block_seconds=STREAM_BLOCK_SECONDS, with_variance=False):
+    """
+    Constant-memory extract_mfcc_features for a file: reads block_seconds of
+    audio at a time, so peak memory does not grow with the file's length.
+    Unlike a live stream, a file can be read twice: the first pass finds the
+    loudest log-mel value (librosa's top_db floor is relative to it), the
+    second accumulates the floored frames, so the result equals
+    extract_mfcc_features within floating-point tolerance. Returns the mean
+    MFCC vector, (mean, variance) with with_variance, or None on error.
+    """
+    try:
+        peak = _stream_file(audio_path, block_seconds)._max_db
+        stream = _stream_file(audio_path, block_seconds, track_variance=with_variance, floor_db=peak - TOP_DB)
+        return (stream.mean(), stream.variance()) if with_variance else stream.mean()
+    except Exception as e:
+        print(f"Error processing {audio_path}: {e}")
+        return None
@@ -1,27 +1,216 @@
-import speech_recognition as sr
+"""
+Speech-to-text behind a small transcriber interface.
 
-def transcribe_audio(audio_path):
-    # Initialize recognizer
-    recognizer = sr.Recognizer()
-    
+Engines, chosen with ASR_ENGINE:
+    google          speech_recognition's recognize_google (network; the default)
+    faster_whisper  local, offline Whisper through faster-whisper
+                    (ASR_WHISPER_MODEL, int8 on CPU by default)
+    vosk            local, offline Kaldi models through vosk
+                    (ASR_VOSK_MODEL = path of the unpacked model directory)
+
+Audio longer than ASR_CHUNK_MAX_SECONDS is split at pauses
+(preprocessing.segment_media.silence_windows). The chunks are transcribed
+concurrently on a shared pool of ASR_WORKERS threads and stitched back in
+order. The whole transcription gets ASR_TIMEOUT seconds: a chunk that fails or
+is still running at the deadline contributes no text instead of failing the
+transcript, and every chunk's status and time are reported.
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+from preprocessing.decode_audio import SAMPLE_RATE, decode_audio, to_pcm16
+from preprocessing.segment_media import silence_windows
+
+ASR_ENGINE = os.environ.get("ASR_ENGINE", "google")
+ASR_WORKERS = int(os.environ.get("ASR_WORKERS", 4))
+ASR_TIMEOUT = float(os.environ.get("ASR_TIMEOUT", 120))
+ASR_CHUNK_MIN_SECONDS = float(os.environ.get("ASR_CHUNK_MIN_SECONDS", 10))
+ASR_CHUNK_MAX_SECONDS = float(os.environ.get("ASR_CHUNK_MAX_SECONDS", 30))
+ASR_WHISPER_MODEL = os.environ.get("ASR_WHISPER_MODEL", "base.en")
+ASR_WHISPER_COMPUTE_TYPE = os.environ.get("ASR_WHISPER_COMPUTE_TYPE", "int8")
+ASR_WHISPER_LANGUAGE = os.environ.get("ASR_WHISPER_LANGUAGE", "en")   # empty: auto-detect
+# Default under the project root, since the server runs from api/
+ASR_VOSK_MODEL = os.environ.get("ASR_VOSK_MODEL") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "vosk")
+
+
+class Transcriber:
+    """Interface: transcribe(samples) -> text for a mono float32 buffer at SAMPLE_RATE ('' when nothing is said)."""
+    name = None
+
+    def transcribe(self, samples):
+        raise NotImplementedError
+
+
+class GoogleTranscriber(Transcriber):
+    name = "google"
+
+    def __init__(self, timeout=ASR_TIMEOUT):
+        import speech_recognition as sr
+        self.sr = sr
+        self.timeout = timeout
+
+    def transcribe(self, samples):
+        recognizer = self.sr.Recognizer()
+        recognizer.operation_timeout = self.timeout
+        audio = self.sr.AudioData(to_pcm16(samples), SAMPLE_RATE, 2)
+        try:
+            return recognizer.recognize_google(audio)
+        except self.sr.UnknownValueError:
+            return ""
+
+
+class FasterWhisperTranscriber(Transcriber):
+    """One CTranslate2 model shared by all threads; num_workers lets ASR_WORKERS chunks decode in parallel."""
+    name = "faster_whisper"
+
+    def __init__(self, model_size=ASR_WHISPER_MODEL, compute_type=ASR_WHISPER_COMPUTE_TYPE, workers=ASR_WORKERS):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device="cpu", compute_type=compute_type, num_workers=workers)
+
+    def transcribe(self, samples):
+        segments, _ = self.model.transcribe(np.asarray(samples, dtype=np.float32),
+                                            language=ASR_WHISPER_LANGUAGE or None, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class VoskTranscriber(Transcriber):
+    """The model is shared; every call gets its own recognizer, so calls are thread-safe."""
+    name = "vosk"
+
+    def __init__(self, model_path=ASR_VOSK_MODEL):
+        import vosk
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def transcribe(self, samples):
+        recognizer = self.vosk.KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(to_pcm16(samples))
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+ENGINES = {cls.name: cls for cls in (GoogleTranscriber, FasterWhisperTranscriber, VoskTranscriber)}
+
+
+def asr_version(engine=None):
+    """Engine and model behind the transcripts, for cache keys of results that depend on them."""
+    engine = engine or ASR_ENGINE
+    if engine == "faster_whisper":
+        return f"{engine}={ASR_WHISPER_MODEL}/{ASR_WHISPER_COMPUTE_TYPE}/{ASR_WHISPER_LANGUAGE}"
+    if engine == "vosk":
+        return f"{engine}={os.path.abspath(ASR_VOSK_MODEL)}"
+    return engine
+
+_transcribers = {}
+_pool = None
+_lock = threading.Lock()
+
+
+def get_transcriber(engine=None) -> Transcriber:
+    """The (process-wide, lazily loaded) transcriber for an engine name, ASR_ENGINE by default."""
+    engine = engine or ASR_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown ASR engine {engine!r}; expected one of {sorted(ENGINES)}")
+    with _lock:
+        if engine not in _transcribers:
+            _transcribers[engine] = ENGINES[engine]()
+        return _transcribers[engine]
+
+
+def _chunk_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=ASR_WORKERS, thread_name_prefix="asr-chunk")
+        return _pool
+
+
+def _transcribe_chunk(transcriber, samples):
+    """(text, error or None, ms) for one chunk."""
+    started = time.perf_counter()
     try:
-        # Load the audio file
-        with sr.AudioFile(audio_path) as source:
-            audio = recognizer.record(source)  # Record the entire audio file
-        
-        # Recognize the speech in the audio
-        transcript = recognizer.recognize_google(audio)
+        text, error = transcriber.transcribe(samples), None
+    except Exception as e:
+        text, error = "", str(e) or type(e).__name__
+    return text, error, round((time.perf_counter() - started) * 1000, 1)
+
+
+def transcribe_chunked(samples, transcriber, timeout=ASR_TIMEOUT):
+    """
+    Transcribe a buffer in pause-aligned chunks on the shared pool.
+    Returns (text, chunks) where chunks lists, in order, each chunk's
+    start / end (seconds), ms and status ('ok', 'error' or 'timeout').
+    """
+    duration = len(samples) / SAMPLE_RATE
+    if duration <= ASR_CHUNK_MAX_SECONDS:
+        windows = [(0.0, round(duration, 3))]
+    else:
+        windows = silence_windows(samples, SAMPLE_RATE, ASR_CHUNK_MIN_SECONDS, ASR_CHUNK_MAX_SECONDS)
+
+    pool = _chunk_pool()
+    started = time.perf_counter()
+    futures = [pool.submit(_transcribe_chunk, transcriber,
+                           samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+               for start, end in windows]
+
+    texts, chunks = [], []
+    for (start, end), future in zip(windows, futures):
+        chunk = {"start": start, "end": end}
+        try:
+            text, error, chunk["ms"] = future.result(timeout=max(0.0, started + timeout - time.perf_counter()))
+            chunk["status"] = "error" if error else "ok"
+            if error:
+                chunk["error"] = error
+            elif text:
+                texts.append(text)
+        except FutureTimeout:
+            future.cancel()
+            chunk.update(status="timeout", ms=round((time.perf_counter() - started) * 1000, 1))
+        chunks.append(chunk)
+    return " ".join(texts), chunks
+
+
+def transcribe_audio(audio_path, report=None, engine=None):
+    """
+    Transcribe an audio/video file, or an already decoded mono float buffer at
+    SAMPLE_RATE (e.g. from preprocessing.decode_audio). Returns None when
+    nothing was recognized. Pass a dict as `report` to receive the engine and
+    the per-chunk timings of transcribe_chunked.
+    """
+    try:
+        transcriber = get_transcriber(engine)
+        samples = audio_path if isinstance(audio_path, np.ndarray) else decode_audio(audio_path)
+        if samples is None:
+            raise ValueError("no decodable audio")
+
+        transcript, chunks = transcribe_chunked(samples, transcriber)
+        if report is not None:
+            report.update(engine=transcriber.name, chunks=chunks)
+        failed = [c for c in chunks if c["status"] != "ok"]
+        if failed:
+            print(f"⚠️ {len(failed)}/{len(chunks)} transcription chunks failed: "
+                  + ", ".join(f"{c['start']}-{c['end']}s {c['status']}" for c in failed))
         print("Transcript:", transcript)
-        return transcript
-    
+        return transcript or None
+
     except Exception as e:
         print(f"Error during transcription: {e}")
         return None
 
 if __name__ == "__main__":
     audio_path = "data/processed_audio/sample_audio.wav"  # Update with your audio file path
-    transcript = transcribe_audio(audio_path)
-    
+    report = {}
+    transcript = transcribe_audio(audio_path, report)
+    for chunk in report.get("chunks", []):
+        print(f"  {chunk['start']:>7.2f}-{chunk['end']:<7.2f}s  {chunk['status']:<7} {chunk['ms']} ms")
+
     if transcript:
         with open("data/transcripts/sample_transcript.txt", "w") as f:
             f.write(transcript)